@@ -38,49 +38,31 @@ CURRENT_DIR = Path(__file__).resolve().parent
 SRC_DIR = CURRENT_DIR / "src"
 
 
-def setup_logging(mode: str) -> Path:
-    """
-    Настраивает логирование в файл и консоль.
-    Логи кладём в ./logs/{mode}_YYYYMMDD_HHMMSS.log
-    """
-    logs_dir = CURRENT_DIR / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_path = logs_dir / f"{mode}_{ts}.log"
-
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.FileHandler(log_path, encoding="utf-8"),
-            logging.StreamHandler(),
-        ],
-    )
-
-    logging.getLogger(__name__).info(
-        "Логирование включено для режима '%s'. Файл: %s", mode, log_path
-    )
-    return log_path
-
-
 # Добавляем src в PYTHONPATH, чтобы видеть пакеты parsing_ski и update_db
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
 # ==== Импортируем реальные реализации ====
 
+from parsing_ski.log_setup import setup as _setup_log  # type: ignore[import]
+
 # diff-логика
 from parsing_ski.diff_exports import (  # type: ignore[import]
     EXPORT_DIR,
-    compare_two_files,
+    compare_exports,
+    find_last_two_exports,
 )
 
-# Скрипты работы с БД
-from update_db.create_db import main as create_db_main  # type: ignore[import]
-from update_db.backfill_orig_price import main as db_backfill_main  # type: ignore[import]
-from update_db.detect_db_changes import main as detect_db_changes_main  # type: ignore[import]
-from update_db.import_csvs import main as import_csv_main  # type: ignore[import]
+# Скрипты работы с БД (update_db.*) импортируются лениво внутри run_db_*,
+# чтобы `--diff` не тянул за собой весь DB-стек.
+
+
+def setup_logging(mode: str) -> Path:
+    """
+    Настраивает логирование в файл и консоль.
+    Логи кладём в ./logs/{mode}_YYYYMMDD_HHMMSS.log
+    """
+    return _setup_log(mode, CURRENT_DIR)
 
 
 def parse_args() -> argparse.Namespace:
@@ -131,30 +113,14 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def _call_cli_main_safely(func):
+def _run_step(module) -> None:
     """
-    Обёртка для сторонних main(), которые внутри themselves используют argparse.
+    Запустить main() шага обновления БД с аргументами по умолчанию.
 
-    Она временно очищает sys.argv, чтобы внутренний argparse
-    не видел ключи manage_data.py (типа --db-all).
+    Namespace собираем явно через parse_args([]) модуля, поэтому ключи
+    manage_data.py (типа --db-all) до внутреннего argparse не доходят.
     """
-    def wrapper():
-        old_argv = sys.argv
-        try:
-            # оставляем только имя скрипта — без флагов manage_data
-            sys.argv = [old_argv[0]]
-            return func()
-        finally:
-            sys.argv = old_argv
-
-    return wrapper
-
-
-# Оборачиваем потенциально "CLI-шные" main-функции
-create_db_safe = _call_cli_main_safely(create_db_main)
-db_backfill_safe = _call_cli_main_safely(db_backfill_main)
-detect_db_changes_safe = _call_cli_main_safely(detect_db_changes_main)
-import_csv_safe = _call_cli_main_safely(import_csv_main)
+    module.main(module.parse_args([]))
 
 
 def run_diff():
@@ -166,17 +132,16 @@ def run_diff():
     logger = logging.getLogger(__name__)
 
     exports_dir = EXPORT_DIR
-    csv_files = sorted(exports_dir.glob("skis_unified_*.csv"))
+    last_two = find_last_two_exports(exports_dir)
 
-    if len(csv_files) < 2:
+    if len(last_two) < 2:
         logger.error(
-            "Недостаточно файлов для diff: найдено %d, нужно минимум 2.",
-            len(csv_files),
+            "Недостаточно файлов для diff: нужно минимум 2 skis_unified_*.csv в %s.",
+            exports_dir,
         )
         return
 
-    old_path = csv_files[-2]
-    new_path = csv_files[-1]
+    old_path, new_path = last_two
 
     logger.info("Old export: %s", old_path.name)
     logger.info("New export: %s", new_path.name)
@@ -196,14 +161,17 @@ def run_diff():
     out_name = f"diff_{old_date}_vs_{new_date}_{ts}.csv"
     out_path = exports_dir / out_name
 
-    compare_two_files(old_path, new_path, out_path)
+    # большие выгрузки сравниваются потоково, без загрузки обоих файлов в память
+    compare_exports(old_path, new_path, out_path)
 
     logger.info("[OK] Diff saved to: %s", out_path)
 
 
 def run_db_init():
+    from update_db import create_db  # type: ignore[import]
+
     setup_logging("db_init")
-    create_db_safe()
+    _run_step(create_db)
 
 
 def run_db_all():
@@ -215,6 +183,12 @@ def run_db_all():
 
     CSV читаются только на шаге импорта, все остальные шаги работают ТОЛЬКО с БД.
     """
+    from update_db import (  # type: ignore[import]
+        backfill_orig_price,
+        detect_db_changes,
+        import_csvs,
+    )
+
     setup_logging("db_all")
     logger = logging.getLogger(__name__)
     logger.info(
@@ -223,15 +197,15 @@ def run_db_all():
     )
 
     # 1) Импорт новых CSV в БД
-    import_csv_safe()
+    _run_step(import_csvs)
     logger.info("Импорт CSV в БД завершён.")
 
     # 2) Бэкфил orig_price
-    db_backfill_safe()
+    _run_step(backfill_orig_price)
     logger.info("Бэкфил БД завершён.")
 
     # 3) Детект изменений между двумя последними run'ами
-    detect_db_changes_safe()
+    _run_step(detect_db_changes)
     logger.info("Детект изменений в БД завершён.")
 
     logger.info("Полная процедура обновления БД успешно завершена.")
@@ -239,18 +213,24 @@ def run_db_all():
 
 
 def run_db_backfill():
+    from update_db import backfill_orig_price  # type: ignore[import]
+
     setup_logging("db_backfill")
-    db_backfill_safe()
+    _run_step(backfill_orig_price)
 
 
 def run_db_detect_changes():
+    from update_db import detect_db_changes  # type: ignore[import]
+
     setup_logging("db_detect_changes")
-    detect_db_changes_safe()
+    _run_step(detect_db_changes)
 
 
 def run_db_import_csv():
+    from update_db import import_csvs  # type: ignore[import]
+
     setup_logging("db_import_csv")
-    import_csv_safe()
+    _run_step(import_csvs)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,11 @@
 import argparse
 import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Dict, Iterator, List
 
 from parsing_ski.models import Product, MIN_SKI_LENGTH_CM, MAX_SKI_LENGTH_CM
 from shops.shop_extreme_ge import scrape_xtreme
@@ -16,6 +20,28 @@ from .export_unified import export_unified_to_csv, get_default_export_path
 
 logger = logging.getLogger(__name__)
 
+# Длины в sizes: любые группы из 2+ цифр ('185', '185cm', '176 სმ')
+_SIZE_DIGITS_RE = re.compile(r"\d{2,}")
+# Запасной вариант: 3-значная длина в названии модели
+_MODEL_LEN_RE = re.compile(r"(\d{3})")
+
+# PARSING_SKI_PARALLEL=0 — парсить магазины по очереди (по умолчанию параллельно)
+PARALLEL_ENV_VAR = "PARSING_SKI_PARALLEL"
+
+# Код магазина -> запуск его парсера с учётом test_mode
+SCRAPERS: Dict[str, Callable[[bool], List[Product]]] = {
+    "xtreme": lambda test: scrape_xtreme(
+        test_mode=test,
+        max_pages=1 if test else None,
+    ),
+    "snowmania": lambda test: scrape_snowmania(
+        test_mode=test,
+        test_max_pages=1 if test else 99,
+    ),
+    "burosports": lambda test: scrape_burosports(test_mode=test),
+    "megasport": lambda test: scrape_megasport(test_mode=test),
+}
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -72,23 +98,18 @@ def product_to_unified_rows_generic(p: Product) -> List[dict]:
 
     sizes = getattr(p, "sizes", []) or []
 
-    # 1. Пытаемся парсить длины из sizes
+    # 1. Пытаемся парсить длины из sizes — одним проходом regex по всем размерам
     lengths: List[int] = []
-    for s in sizes:
-        clean = "".join(
-            ch if ch.isdigit() or ch.isspace() else " " for ch in (s or "")
-        )
-        for chunk in clean.split():
-            if len(chunk) >= 2 and chunk.isdigit():
-                L = int(chunk)
-                if MIN_SKI_LENGTH_CM <= L <= MAX_SKI_LENGTH_CM and L not in lengths:
-                    lengths.append(L)
+    seen: set = set()
+    for chunk in _SIZE_DIGITS_RE.findall(" ".join(s or "" for s in sizes)):
+        L = int(chunk)
+        if MIN_SKI_LENGTH_CM <= L <= MAX_SKI_LENGTH_CM and L not in seen:
+            seen.add(L)
+            lengths.append(L)
 
     # 2. Если ничего не нашли — пробуем из model
     if not lengths and (p.model or ""):
-        import re as _re
-
-        m = _re.search(r"(\d{3})", p.model)
+        m = _MODEL_LEN_RE.search(p.model)
         if m:
             L = int(m.group(1))
             if MIN_SKI_LENGTH_CM <= L <= MAX_SKI_LENGTH_CM:
@@ -115,6 +136,33 @@ def product_to_unified_rows_generic(p: Product) -> List[dict]:
     return rows
 
 
+# Код магазина -> конвертер Product в строки унифицированного формата
+TO_ROWS: Dict[str, Callable[[Product], List[dict]]] = {
+    "xtreme": product_to_unified_rows_generic,
+    "snowmania": product_to_unified_rows_generic,
+    "burosports": burosports_product_to_unified_rows,
+    "megasport": product_to_unified_rows_generic,
+}
+
+
+def _parallel_enabled() -> bool:
+    value = os.environ.get(PARALLEL_ENV_VAR, "1").strip().lower()
+    return value not in ("0", "false", "no", "off")
+
+
+def _scrape_shop(code: str, shop_name: str, test_mode: bool) -> List[Product]:
+    """Запустить парсер одного магазина (выполняется в отдельном потоке)."""
+    logger.info("[RUN] Scraping %s ...", shop_name)
+
+    scraper = SCRAPERS.get(code)
+    if scraper is None:
+        return []
+    products = scraper(test_mode)
+
+    logger.info("[INFO] %s: %d products scraped", shop_name, len(products))
+    return products
+
+
 def main() -> None:
     args = parse_args()
 
@@ -136,48 +184,39 @@ def main() -> None:
             raise SystemExit(f"Unknown shop codes: {', '.join(unknown)}")
         shop_codes = requested
 
-    all_rows: List[dict] = []
-
-    for code in shop_codes:
-        logger.info("[RUN] Scraping %s ...", available_shops[code])
-
-        if code == "xtreme":
-            products = scrape_xtreme(
-                test_mode=args.test,
-                max_pages=1 if args.test else None,
-            )
-        elif code == "snowmania":
-            products = scrape_snowmania(
-                test_mode=args.test,
-                test_max_pages=1 if args.test else 99,
-            )
-        elif code == "burosports":
-            products = scrape_burosports(test_mode=args.test)
-        elif code == "megasport":
-            products = scrape_megasport(test_mode=args.test)
-        else:
-            continue
-
-        logger.info(
-            "[INFO] %s: %d products scraped",
-            available_shops[code],
-            len(products),
-        )
-
-        for p in products:
-            if code == "burosports":
-                rows = burosports_product_to_unified_rows(p)
-            else:
-                rows = product_to_unified_rows_generic(p)
-            all_rows.extend(rows)
-
-    if not all_rows:
+    # Магазины независимы и упираются в сеть — парсим их параллельно,
+    # а результаты собираем в исходном порядке shop_codes.
+    if _parallel_enabled():
+        with ThreadPoolExecutor(max_workers=len(shop_codes) or 1) as ex:
+            futures = [
+                ex.submit(_scrape_shop, code, available_shops[code], args.test)
+                for code in shop_codes
+            ]
+            results = [f.result() for f in futures]
+    else:
+        results = [
+            _scrape_shop(code, available_shops[code], args.test)
+            for code in shop_codes
+        ]
+
+    def iter_rows() -> Iterator[dict]:
+        # строки отдаются прямо в CSV, общий список всех строк не строится
+        for code, products in zip(shop_codes, results):
+            # конвертация — один regex на товар, на порядки дешевле парсинга,
+            # поэтому в процессы её не выносим
+            to_rows = TO_ROWS.get(code, product_to_unified_rows_generic)
+            for p in products:
+                yield from to_rows(p)
+
+    rows = iter_rows()
+    first_row = next(rows, None)
+    if first_row is None:
         logger.warning("[WARN] No rows scraped, nothing to export.")
         return
 
     out_path = Path(args.output) if args.output else get_default_export_path()
     export_unified_to_csv(
-        all_rows,
+        chain([first_row], rows),
         filename=out_path,
         min_length=args.min_length,
         max_length=args.max_length,
@@ -1,14 +1,71 @@
 import csv
+import filecmp
+import heapq
 import logging
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from contextlib import ExitStack
+from functools import lru_cache
+from collections import namedtuple
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import Optional, Dict, Tuple, List
+from typing import Optional, Dict, Tuple, List, Iterable, Iterator
 
-logger = logging.getLogger(__name__)
-
-# Каталог с итоговыми CSV
-EXPORT_DIR = Path(__file__).resolve().parents[2] / "data" / "exports"
+from .paths import EXPORT_DIR
 
+logger = logging.getLogger(__name__)
 
+# Начиная с какого размера файла diff считается потоково (без загрузки в память)
+STREAMING_DIFF_MIN_BYTES = 64 * 1024 * 1024
+# Сколько строк сортируется в памяти за раз при внешней сортировке
+STREAMING_SORT_CHUNK_ROWS = 100_000
+# Буфер чтения CSV при потоковом сравнении
+READ_BUFFER_SIZE = 1 << 20
+# Буфер записи diff-файла
+WRITE_BUFFER_SIZE = 1 << 16
+
+# Бинарная копия строк экспорта рядом с CSV: skis_unified_*.rows.marshal.
+# Строки хранятся ровно в том виде, в каком их вернул бы csv.reader,
+# но загружаются без разбора текста. Формат — marshal списков строк, а не pickle:
+# чужой или подложенный файл рядом с CSV не может выполнить код при загрузке
+ROWS_SIDECAR_SUFFIX = ".rows.marshal"
+ROWS_SIDECAR_VERSION = 4
+# Сразу за версией — st_size и st_mtime_ns CSV, из которого сделана копия:
+# копией пользуемся, только если оба совпадают с текущим CSV
+_SIDECAR_STAT = struct.Struct("<qq")
+
+# Размер кэшей parse_length / parse_price: различных длин и цен в выгрузке
+# немного (одна модель повторяется в нескольких размерах)
+PARSE_CACHE_SIZE = 4096
+
+# Порядок колонок diff-файла: №, status, shop, brand, ...
+DIFF_FIELDNAMES = [
+    "№",
+    "status",
+    "shop",
+    "brand",
+    "model",
+    "length_cm",
+    "condition",
+    "orig_price",
+    "price",
+    "url",
+]
+
+# Строка экспорта в памяти при сравнении: только нужные diff колонки
+# (поля 0..7 идут в порядке DIFF_FIELDNAMES после status) + разобранная цена.
+# Кортеж заметно компактнее dict на строку и быстрее по доступу к полям.
+DiffRecord = namedtuple(
+    "DiffRecord",
+    "shop brand model length_cm condition orig_price price url price_f",
+)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_length(value: str) -> Optional[int]:
     """
     Приводим length_cm к int (например '170.0' -> 170).
@@ -19,6 +76,9 @@ def parse_length(value: str) -> Optional[int]:
     s = str(value).strip()
     if not s:
         return None
+    # обычный случай — целое ('170'): без float и round
+    if s.isdecimal():
+        return int(s)
     try:
         s = s.replace(",", ".")
         f = float(s)
@@ -27,6 +87,7 @@ def parse_length(value: str) -> Optional[int]:
         return None
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_price(value: str) -> Optional[float]:
     """
     Приводим price к float для сравнения.
@@ -36,6 +97,9 @@ def parse_price(value: str) -> Optional[float]:
     s = str(value).strip()
     if not s:
         return None
+    # обычный случай — '1700' или '1700.0': сразу в float, без replace
+    if s.replace(".", "", 1).isdecimal():
+        return float(s)
     s = s.replace(" ", "").replace(",", ".")
     try:
         return float(s)
@@ -43,22 +107,167 @@ def parse_price(value: str) -> Optional[float]:
         return None
 
 
-def read_csv_to_map(path: Path) -> Dict[Tuple[str, str, Optional[int]], dict]:
+def rows_sidecar_path(csv_path: Path) -> Path:
+    return csv_path.with_name(csv_path.stem + ROWS_SIDECAR_SUFFIX)
+
+
+def write_rows_sidecar(
+    csv_path: Path,
+    header: List[str],
+    rows: Iterable[List[str]],
+    chunk_rows: int = STREAMING_SORT_CHUNK_ROWS,
+) -> int:
+    """
+    Сохраняет строки экспорта (списки строк, как их вернул бы csv.reader)
+    в бинарный файл рядом с CSV. Строки пишутся кусками по chunk_rows,
+    так что весь экспорт в памяти не держится. Возвращает число строк.
+
+    К концу rows CSV должен быть дописан: его размер и mtime попадают
+    в заголовок копии.
+    """
+    path = rows_sidecar_path(csv_path)
+    count = 0
+    with path.open("wb") as f:
+        marshal.dump(ROWS_SIDECAR_VERSION, f)
+        # место под размер и mtime CSV, заполняем после последней строки
+        stat_pos = f.tell()
+        f.write(_SIDECAR_STAT.pack(-1, -1))
+        marshal.dump(list(header), f)
+        chunk: List[List[str]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                marshal.dump(chunk, f)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            marshal.dump(chunk, f)
+            count += len(chunk)
+        st = csv_path.stat()
+        f.seek(stat_pos)
+        f.write(_SIDECAR_STAT.pack(st.st_size, st.st_mtime_ns))
+    return count
+
+
+def _load_rows_sidecar(csv_path: Path) -> Optional[List[List[str]]]:
+    """
+    Заголовок и строки из бинарной копии (как их отдал бы csv.reader),
+    если она есть и сделана именно из этого CSV: размер и mtime_ns совпадают
+    с записанными в её заголовке. CSV могли поправить руками или подменить
+    файлом со старым mtime (cp -p, rsync, git checkout), поэтому
+    "копия не старше CSV" недостаточно. Иначе None — читаем CSV.
+    """
+    path = rows_sidecar_path(csv_path)
+    try:
+        with path.open("rb") as f:
+            if marshal.load(f) != ROWS_SIDECAR_VERSION:
+                return None
+            st = csv_path.stat()
+            header = f.read(_SIDECAR_STAT.size)
+            if _SIDECAR_STAT.unpack(header) != (st.st_size, st.st_mtime_ns):
+                return None
+            rows: List[List[str]] = [marshal.load(f)]
+            while True:
+                try:
+                    rows.extend(marshal.load(f))
+                except EOFError:
+                    break
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("[WARN] Ignoring broken sidecar %s: %s", path.name, e)
+        return None
+    if not all(type(row) is list for row in rows):
+        logger.warning("[WARN] Ignoring broken sidecar %s: unexpected row type", path.name)
+        return None
+    return rows
+
+
+def read_csv_to_map(path: Path) -> Dict[Tuple[str, str, Optional[int]], DiffRecord]:
     """
     Читает CSV и строит словарь:
         key = (shop, model, length_cm_int_or_None)
-        value = строка CSV (dict)
+        value = DiffRecord (нужные колонки строки + разобранная цена price_f)
+
+    Если рядом лежит актуальный skis_unified_*.rows.marshal — берём строки из него.
     """
-    mapping: Dict[Tuple[str, str, Optional[int]], dict] = {}
+    rows = _load_rows_sidecar(path)
+    if rows is not None:
+        return _index_csv_rows(iter(rows))
+
     with path.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # поддерживаем и старый вариант "shops", и новый "shop"
-            shop = row.get("shop") or row.get("shops") or ""
-            model = row.get("model") or ""
-            length = parse_length(row.get("length_cm"))
-            key = (shop, model, length)
-            mapping[key] = row
+        return _index_csv_rows(csv.reader(f))
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """
+    shop (4 значения на весь файл) и model (повторяется на каждую длину)
+    храним в одном экземпляре: ключи меньше весят, а сравнение одинаковых
+    строк в dict сводится к сравнению указателей.
+    """
+    return sys.intern(value) if value else value
+
+
+# Колонки CSV, из которых собирается DiffRecord (shops — старое имя shop)
+_RECORD_COLUMNS = (
+    "shop",
+    "shops",
+    "brand",
+    "model",
+    "length_cm",
+    "condition",
+    "orig_price",
+    "price",
+    "url",
+)
+
+
+def _index_csv_rows(
+    reader: Iterator[List[str]],
+) -> Dict[Tuple[str, str, Optional[int]], DiffRecord]:
+    """
+    Строки по ключу (shop, model, length_cm); для повторов остаётся последняя.
+    Цену разбираем здесь же (price_f), чтобы при сравнении не парсить строку
+    заново. Работает прямо по спискам csv.reader (или бинарной копии):
+    индексы колонок считаются один раз по заголовку, dict на строку не создаётся.
+
+    Поведение как у csv.DictReader: пустые строки пропускаются, для
+    недостающих колонок (и коротких строк) значение None, при повторе имени
+    в заголовке берётся последняя колонка.
+    """
+    header = next(reader, None)
+    if header is None:
+        return {}
+    width = len(header)
+    columns = {name: i for i, name in enumerate(header)}
+    # отсутствующие колонки смотрят на индекс width — туда кладём None
+    get_fields = itemgetter(*(columns.get(name, width) for name in _RECORD_COLUMNS))
+    pad = [None] * width
+
+    mapping: Dict[Tuple[str, str, Optional[int]], DiffRecord] = {}
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != width:
+            row = (row + pad)[:width]
+        row.append(None)
+        shop, shops, brand, model, length_cm, condition, orig_price, price, url = (
+            get_fields(row)
+        )
+        shop = _intern(shop or shops)
+        model = _intern(model)
+        key = (shop or "", model or "", parse_length(length_cm))
+        mapping[key] = DiffRecord(
+            shop,
+            brand,
+            model,
+            length_cm,
+            condition,
+            orig_price,
+            price,
+            url,
+            parse_price(price),
+        )
     return mapping
 
 
@@ -75,6 +284,51 @@ def _key_sorter(key: Tuple[str, str, Optional[int]]):
     return (shop or "", model or "", length_sort)
 
 
+def _row_key(row: dict) -> Tuple[str, str, Optional[int]]:
+    # поддерживаем и старый вариант "shops", и новый "shop"
+    shop = row.get("shop") or row.get("shops") or ""
+    model = row.get("model") or ""
+    return shop, model, parse_length(row.get("length_cm"))
+
+
+def _merge_sort_key(key: Tuple[str, str, Optional[int]]) -> tuple:
+    """
+    Тот же порядок, что у _key_sorter, но без совпадений для разных ключей
+    (None и -1 различаются) — нужно для слияния отсортированных потоков.
+    """
+    return _key_sorter(key) + (key[2] is not None,)
+
+
+def _to_diff_row(status: str, base: dict) -> tuple:
+    """Строка диффа в порядке DIFF_FIELDNAMES (без колонки №)."""
+    return (
+        status,
+        base.get("shop") or base.get("shops"),
+        base.get("brand"),
+        base.get("model"),
+        base.get("length_cm"),
+        base.get("condition"),
+        base.get("orig_price"),
+        base.get("price"),
+        base.get("url"),
+    )
+
+
+def _write_diff_rows(out_path: Path, diff_rows: Iterable[tuple]) -> int:
+    """Пишет строки диффа с нумерацией в колонке №. Возвращает число строк."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    with out_path.open(
+        "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER_SIZE
+    ) as f:
+        writer = csv.writer(f)
+        writer.writerow(DIFF_FIELDNAMES)
+        for count, row in enumerate(diff_rows, start=1):
+            writer.writerow((count,) + row)
+    return count
+
+
 def compare_two_files(old_path: Path, new_path: Path, out_path: Path) -> Path:
     """
     Сравнивает два CSV и пишет третий с изменениями.
@@ -88,77 +342,36 @@ def compare_two_files(old_path: Path, new_path: Path, out_path: Path) -> Path:
     old_map = read_csv_to_map(old_path)
     new_map = read_csv_to_map(new_path)
 
-    all_keys = set(old_map.keys()) | set(new_map.keys())
-    diff_rows: List[dict] = []
-
-    count_sold_out = 0
-    count_new = 0
-    count_price_change = 0
-
-    for key in sorted(all_keys, key=_key_sorter):
-        in_old = key in old_map
-        in_new = key in new_map
-
-        if in_old and not in_new:
-            status = "sold_out"
-            base = old_map[key]
+    # (key, status, строка для вывода); для price_change показываем новую цену.
+    # Один проход по old с new_map.get: сразу и sold_out, и сравнение цены
+    # на пересечении; new_arrival — anti-join по ключам в обратную сторону.
+    entries: List[Tuple[tuple, str, DiffRecord]] = []
+    count_sold_out = count_price_change = 0
+    for key, old_row in old_map.items():
+        new_row = new_map.get(key)
+        if new_row is None:
+            entries.append((key, "sold_out", old_row))
             count_sold_out += 1
-        elif not in_old and in_new:
-            status = "new_arrival"
-            base = new_map[key]
-            count_new += 1
-        else:
-            # есть и там, и там — проверяем изменение цены
-            old_price = parse_price(old_map[key].get("price"))
-            new_price = parse_price(new_map[key].get("price"))
-            if old_price == new_price:
-                # никаких изменений — пропускаем
-                continue
-            status = "price_change"
-            base = new_map[key]  # показываем новую цену
+        elif old_row.price_f != new_row.price_f:
+            entries.append((key, "price_change", new_row))
             count_price_change += 1
 
-        row = {
-            "status": status,
-            "shop": base.get("shop") or base.get("shops"),
-            "brand": base.get("brand"),
-            "model": base.get("model"),
-            "length_cm": base.get("length_cm"),
-            "condition": base.get("condition"),
-            "orig_price": base.get("orig_price"),
-            "price": base.get("price"),
-            "url": base.get("url"),
-        }
-        diff_rows.append(row)
+    new_arrival_keys = new_map.keys() - old_map.keys()
+    count_new = len(new_arrival_keys)
+    entries += [(key, "new_arrival", new_map[key]) for key in new_arrival_keys]
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # сортируем только строки диффа, а не все ключи обоих файлов
+    entries.sort(key=lambda e: _key_sorter(e[0]))
 
-    # Порядок колонок: №, status, shop, brand, ...
-    fieldnames = [
-        "№",
-        "status",
-        "shop",
-        "brand",
-        "model",
-        "length_cm",
-        "condition",
-        "orig_price",
-        "price",
-        "url",
-    ]
-
-    with out_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for idx, row in enumerate(diff_rows, start=1):
-            row_to_write = {"№": idx}
-            row_to_write.update(row)
-            writer.writerow(row_to_write)
+    # первые 8 полей DiffRecord — это и есть колонки диффа после status
+    total = _write_diff_rows(
+        out_path, ((status,) + rec[:-1] for _key, status, rec in entries)
+    )
 
     logger.info(
         "[OK] Diff saved to: %s (rows: %d; sold_out=%d, new_arrival=%d, price_change=%d)",
         out_path,
-        len(diff_rows),
+        total,
         count_sold_out,
         count_new,
         count_price_change,
@@ -166,6 +379,167 @@ def compare_two_files(old_path: Path, new_path: Path, out_path: Path) -> Path:
     return out_path
 
 
+def _iter_key_sorted_rows(
+    path: Path,
+    chunk_rows: int = STREAMING_SORT_CHUNK_ROWS,
+) -> Iterator[Tuple[tuple, dict]]:
+    """
+    Отдаёт строки CSV по одной, отсортированные по ключу (shop, model, length_cm).
+
+    Внешняя сортировка: файл читается кусками по chunk_rows строк, каждый кусок
+    сортируется и сбрасывается во временный CSV, затем куски сливаются heapq.merge.
+    Одновременно в памяти держится не больше одного куска.
+
+    Для повторяющихся ключей строки идут в порядке файла (сортировка и merge
+    стабильны), поэтому последняя из них совпадает с той, что оставил бы
+    read_csv_to_map.
+    """
+
+    def keyed(row: dict) -> Tuple[tuple, dict]:
+        return _merge_sort_key(_row_key(row)), row
+
+    with path.open(newline="", encoding="utf-8", buffering=READ_BUFFER_SIZE) as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+        chunk: List[Tuple[tuple, dict]] = []
+        with tempfile.TemporaryDirectory(prefix="skis_diff_") as tmp_dir:
+            chunk_paths: List[Path] = []
+            for row in reader:
+                chunk.append(keyed(row))
+                if len(chunk) >= chunk_rows:
+                    chunk_paths.append(
+                        _dump_sorted_chunk(chunk, fieldnames, Path(tmp_dir), len(chunk_paths))
+                    )
+                    chunk = []
+
+            if not chunk_paths:
+                # весь файл поместился в один кусок — временные файлы не нужны
+                chunk.sort(key=itemgetter(0))
+                yield from chunk
+                return
+
+            if chunk:
+                chunk_paths.append(
+                    _dump_sorted_chunk(chunk, fieldnames, Path(tmp_dir), len(chunk_paths))
+                )
+                chunk = []
+
+            with ExitStack() as stack:
+                readers = [
+                    map(
+                        keyed,
+                        csv.DictReader(
+                            stack.enter_context(
+                                p.open(newline="", encoding="utf-8", buffering=READ_BUFFER_SIZE)
+                            )
+                        ),
+                    )
+                    for p in chunk_paths
+                ]
+                yield from heapq.merge(*readers, key=itemgetter(0))
+
+
+def _dump_sorted_chunk(
+    chunk: List[Tuple[tuple, dict]],
+    fieldnames: List[str],
+    tmp_dir: Path,
+    idx: int,
+) -> Path:
+    chunk.sort(key=itemgetter(0))
+    chunk_path = tmp_dir / f"chunk_{idx:05d}.csv"
+    with chunk_path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(row for _key, row in chunk)
+    return chunk_path
+
+
+def _iter_unique_sorted(path: Path, chunk_rows: int) -> Iterator[Tuple[tuple, dict]]:
+    """Как _iter_key_sorted_rows, но для повторов ключа оставляет последнюю строку."""
+    for key, group in groupby(_iter_key_sorted_rows(path, chunk_rows), key=itemgetter(0)):
+        last = None
+        for last in group:
+            pass
+        yield key, last[1]
+
+
+def compare_two_files_streaming(
+    old_path: Path,
+    new_path: Path,
+    out_path: Path,
+    chunk_rows: int = STREAMING_SORT_CHUNK_ROWS,
+) -> Path:
+    """
+    То же, что compare_two_files, но без загрузки обоих файлов целиком.
+
+    Оба CSV сортируются по ключу (внешней сортировкой, см. _iter_key_sorted_rows)
+    и сливаются одним линейным проходом:
+      - ключ только в old  -> sold_out
+      - ключ только в new  -> new_arrival
+      - ключ в обоих       -> сравниваем цену (price_change)
+
+    Результат совпадает с compare_two_files, но пиковая память ограничена
+    куском в chunk_rows строк, а не размером обоих файлов.
+    """
+    old_it = _iter_unique_sorted(old_path, chunk_rows)
+    new_it = _iter_unique_sorted(new_path, chunk_rows)
+
+    counts = {"sold_out": 0, "new_arrival": 0, "price_change": 0}
+
+    def merged() -> Iterator[tuple]:
+        old_item = next(old_it, None)
+        new_item = next(new_it, None)
+        while old_item is not None or new_item is not None:
+            if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+                status, base = "sold_out", old_item[1]
+                old_item = next(old_it, None)
+            elif old_item is None or new_item[0] < old_item[0]:
+                status, base = "new_arrival", new_item[1]
+                new_item = next(new_it, None)
+            else:
+                old_row, new_row = old_item[1], new_item[1]
+                old_item = next(old_it, None)
+                new_item = next(new_it, None)
+                if parse_price(old_row.get("price")) == parse_price(new_row.get("price")):
+                    continue
+                status, base = "price_change", new_row
+            counts[status] += 1
+            yield _to_diff_row(status, base)
+
+    total = _write_diff_rows(out_path, merged())
+
+    logger.info(
+        "[OK] Diff saved to: %s (rows: %d; sold_out=%d, new_arrival=%d, price_change=%d)",
+        out_path,
+        total,
+        counts["sold_out"],
+        counts["new_arrival"],
+        counts["price_change"],
+    )
+    return out_path
+
+
+def compare_exports(old_path: Path, new_path: Path, out_path: Path) -> Path:
+    """
+    Выбирает способ сравнения по размеру файлов: большие выгрузки сравниваются
+    потоково (compare_two_files_streaming), обычные — в памяти.
+
+    Если файлы побайтно совпадают (diff запустили повторно без нового
+    парсинга), сразу пишется пустой diff без разбора CSV.
+    """
+    # filecmp сначала сравнивает размеры, содержимое читает только при равенстве
+    if filecmp.cmp(old_path, new_path, shallow=False):
+        _write_diff_rows(out_path, ())
+        logger.info("[OK] Exports are identical, empty diff saved to: %s", out_path)
+        return out_path
+
+    size = max(old_path.stat().st_size, new_path.stat().st_size)
+    if size > STREAMING_DIFF_MIN_BYTES:
+        logger.info("[INFO] Exports are large (%d bytes), using streaming diff", size)
+        return compare_two_files_streaming(old_path, new_path, out_path)
+    return compare_two_files(old_path, new_path, out_path)
+
+
 def find_last_two_exports(
     export_dir: Path = EXPORT_DIR,
     prefix: str = "skis_unified_",
@@ -175,13 +549,24 @@ def find_last_two_exports(
     Ищет два последних по имени файла типа skis_unified_YYYYMMDD_HHMM.csv
     в каталоге export_dir.
     """
-    files = sorted(
-        [p for p in export_dir.glob(f"{prefix}*{suffix}") if p.is_file()],
-        key=lambda p: p.name,
-    )
-    if len(files) < 2:
+    # нужны только два максимальных имени: nlargest за O(N) вместо полной сортировки,
+    # а DirEntry.is_file() обычно не требует отдельного stat
+    try:
+        with os.scandir(export_dir) as it:
+            names = [
+                e.name
+                for e in it
+                if e.name.startswith(prefix)
+                and e.name.endswith(suffix)
+                and len(e.name) >= len(prefix) + len(suffix)
+                and e.is_file()
+            ]
+    except FileNotFoundError:
         return []
-    return files[-2:]
+    if len(names) < 2:
+        return []
+    newest, previous = heapq.nlargest(2, names)
+    return [export_dir / previous, export_dir / newest]
 
 
 def compare_last_two_exports() -> Optional[Path]:
@@ -207,7 +592,7 @@ def compare_last_two_exports() -> Optional[Path]:
 
     logger.info("[INFO] Old export: %s", old_path.name)
     logger.info("[INFO] New export: %s", new_path.name)
-    return compare_two_files(old_path, new_path, out_path)
+    return compare_exports(old_path, new_path, out_path)
 
 
 def main() -> None:
@@ -1,10 +1,18 @@
 import csv
 from pathlib import Path
 from datetime import datetime
-from typing import Iterable, List, Optional, Union, Dict, Any
+from operator import itemgetter
+from typing import Iterable, Iterator, Optional, Union, Dict, Any
+
+from .diff_exports import write_rows_sidecar
+from .paths import EXPORT_DIR
 
 # Каталог для экспорта относительно корня проекта
-DEFAULT_EXPORT_DIR = Path(__file__).resolve().parents[2] / "data" / "exports"
+DEFAULT_EXPORT_DIR = EXPORT_DIR
+
+# Строки пишутся в CSV пачками через writerows, файл — с большим буфером
+WRITE_CHUNK_ROWS = 4096
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 def get_default_export_path(prefix: str = "skis_unified") -> Path:
@@ -26,64 +34,108 @@ UNIFIED_HEADER = [
     "url",
 ]
 
+# Значения строки (без №) одним вызовом, строго в порядке UNIFIED_HEADER
+_ITEM_FIELDS = tuple(UNIFIED_HEADER[1:])
+_get_item_fields = itemgetter(*_ITEM_FIELDS)
+
 
 def export_unified_to_csv(
     items: Iterable[Dict[str, Any]],
     filename: Union[str, Path],
     min_length: Optional[int] = None,
     max_length: Optional[int] = None,
-) -> None:
+) -> int:
     """
-    Экспортирует список словарей в CSV в унифицированном формате.
+    Экспортирует словари в CSV в унифицированном формате.
 
     items — iterable словарей с ключами:
         shop, brand, model, condition, orig_price, price, length_cm, url
+    Читается потоково: можно передать генератор, в памяти список не строится.
 
     filename — строка или Path до итогового CSV.
 
     min_length / max_length — необязательные границы длины лыж в см.
+
+    Возвращает число записанных строк.
     """
     path = Path(filename)
     path.parent.mkdir(parents=True, exist_ok=True)
 
-    # 1. Фильтрация по длине, если заданы границы
-    filtered: List[Dict[str, Any]] = []
+    # бинарную копию для diff_exports пишем только для выгрузок в EXPORT_DIR:
+    # diff ищет их там, а копии рядом с произвольным --output никто не убирает
+    with_sidecar = path.resolve().parent == DEFAULT_EXPORT_DIR.resolve()
+
+    with path.open("w", newline="", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(UNIFIED_HEADER)
+
+        def written_rows() -> Iterator[tuple]:
+            """
+            Пишет строку в CSV и отдаёт её дальше (для бинарной копии),
+            так что CSV и .rows.marshal заполняются за один проход по items.
+            """
+            chunk = []
+            for idx, item in enumerate(_iter_filtered(items, min_length, max_length), start=1):
+                try:
+                    values = _get_item_fields(item)
+                except KeyError:
+                    # словарь без части ключей: недостающие колонки пустые
+                    values = tuple(map(item.get, _ITEM_FIELDS))
+                row = (idx, *values)
+                chunk.append(row)
+                if len(chunk) >= WRITE_CHUNK_ROWS:
+                    writer.writerows(chunk)
+                    chunk.clear()
+                yield row
+            writer.writerows(chunk)
+            # CSV дописан до конца раньше, чем бинарная копия запишет его
+            # размер и mtime: иначе diff посчитал бы .rows.marshal устаревшим
+            f.flush()
+
+        if with_sidecar:
+            # текст ячеек как в CSV: None -> "", остальное через str()
+            count = write_rows_sidecar(
+                path,
+                UNIFIED_HEADER,
+                (["" if v is None else str(v) for v in row] for row in written_rows()),
+            )
+        else:
+            count = sum(1 for _row in written_rows())
+
+    print(f"[OK] Exported {count} rows to {path}")
+    return count
+
+
+def _iter_filtered(
+    items: Iterable[Dict[str, Any]],
+    min_length: Optional[int],
+    max_length: Optional[int],
+) -> Iterator[Dict[str, Any]]:
+    """Фильтрация по длине, если заданы границы (строки без длины проходят)."""
+    if min_length is None and max_length is None:
+        # границ нет — фильтровать нечего
+        yield from items
+        return
+
+    # отсутствующую границу заменяем бесконечностью: одно сравнение на строку
+    lo = min_length if min_length is not None else float("-inf")
+    hi = max_length if max_length is not None else float("inf")
+
     for item in items:
         length = item.get("length_cm")
 
-        if length is not None:
+        # обычно длина уже int (или None) — без try/except
+        if isinstance(length, int):
+            L = length
+        elif length is None:
+            L = None
+        else:
             try:
                 L = int(length)
             except (TypeError, ValueError):
                 L = None
-        else:
-            L = None
 
-        if L is not None:
-            if min_length is not None and L < min_length:
-                continue
-            if max_length is not None and L > max_length:
-                continue
-
-        filtered.append(item)
-
-    # 2. Запись CSV
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=UNIFIED_HEADER)
-        writer.writeheader()
-
-        for idx, item in enumerate(filtered, start=1):
-            row = {
-                "№": idx,
-                "shop": item.get("shop"),
-                "brand": item.get("brand"),
-                "model": item.get("model"),
-                "condition": item.get("condition"),
-                "orig_price": item.get("orig_price"),
-                "price": item.get("price"),
-                "length_cm": item.get("length_cm"),
-                "url": item.get("url"),
-            }
-            writer.writerow(row)
-
-    print(f"[OK] Exported {len(filtered)} rows to {path}")
+        if L is not None and not lo <= L <= hi:
+            continue
+
+        yield item
@@ -0,0 +1,207 @@
+"""
+Простой HTTP-кэш на SQLite для условных запросов (ETag / Last-Modified).
+
+Для каждого URL храним тело последнего ответа, его валидаторы и (по желанию)
+результат разбора страницы. При повторном запросе шлём If-None-Match /
+If-Modified-Since: на 304 (или если пришло байт-в-байт то же тело) отдаём
+сохранённое, и страницу можно не разбирать заново.
+
+Разбор хранится вместе с версией парсера (payload_version): если парсер
+поменялся, старый разбор считается отсутствующим и страница разбирается заново.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+
+from .paths import CACHE_DIR
+
+DEFAULT_CACHE_PATH = CACHE_DIR / "http_cache.sqlite"
+
+_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    url           TEXT PRIMARY KEY,
+    etag          TEXT,
+    last_modified TEXT,
+    body          TEXT NOT NULL,
+    body_sha1     TEXT NOT NULL,
+    payload       TEXT,
+    payload_version INTEGER,
+    fetched_at    TEXT NOT NULL,
+    accessed_at   TEXT NOT NULL
+)
+"""
+
+
+@dataclass
+class CachedPage:
+    url: str
+    text: str
+    # True — содержимое не изменилось с прошлого запроса (304 или тот же sha1)
+    unchanged: bool
+    # сохранённый результат разбора страницы (None, если его нет
+    # или он сделан другой версией парсера)
+    payload: Any = None
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class HttpCache:
+    """
+    Потокобезопасный кэш: одно соединение SQLite под общим замком,
+    файл создаётся лениво при первом запросе.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH) -> None:
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # вызывается только под self._lock
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_CREATE_SQL)
+            # кэш, созданный до появления версии разбора: добавляем колонку,
+            # старые разборы (NULL) ни с одной версией не совпадут
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(http_cache)")}
+            if "payload_version" not in columns:
+                conn.execute("ALTER TABLE http_cache ADD COLUMN payload_version INTEGER")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def fetch(
+        self,
+        session: requests.Session,
+        url: str,
+        timeout: float = 20,
+        payload_version: Optional[int] = None,
+    ) -> CachedPage:
+        """
+        Условный GET. Бросает requests.HTTPError на ошибочный статус,
+        как resp.raise_for_status().
+
+        Сохранённый разбор отдаётся, только если он записан с той же
+        payload_version; иначе payload=None и страницу надо разобрать заново.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT etag, last_modified, body, body_sha1, payload, payload_version "
+                "FROM http_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+        # разбор другой версией парсера всё равно что отсутствует
+        stored_payload = None
+        if row is not None and payload_version is not None and row[5] == payload_version:
+            stored_payload = row[4]
+
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+
+        resp = session.get(url, headers=headers, timeout=timeout)
+
+        if resp.status_code == 304 and row is not None:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "UPDATE http_cache SET accessed_at = ? WHERE url = ?",
+                    (_now_iso(), url),
+                )
+                conn.commit()
+            return CachedPage(url, row[2], True, _loads(stored_payload))
+
+        resp.raise_for_status()
+
+        text = resp.text
+        body_sha1 = hashlib.sha1(resp.content).hexdigest()
+        # 200, но тело то же самое — разбор тоже можно переиспользовать
+        unchanged = row is not None and row[3] == body_sha1
+        payload_json = stored_payload if unchanged else None
+        stored_version = payload_version if payload_json is not None else None
+
+        now = _now_iso()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                """
+                INSERT INTO http_cache
+                    (url, etag, last_modified, body, body_sha1, payload,
+                     payload_version, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    body = excluded.body,
+                    body_sha1 = excluded.body_sha1,
+                    payload = excluded.payload,
+                    payload_version = excluded.payload_version,
+                    fetched_at = excluded.fetched_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (
+                    url,
+                    resp.headers.get("ETag"),
+                    resp.headers.get("Last-Modified"),
+                    text,
+                    body_sha1,
+                    payload_json,
+                    stored_version,
+                    now,
+                    now,
+                ),
+            )
+            conn.commit()
+
+        return CachedPage(url, text, unchanged, _loads(payload_json))
+
+    def store_payload(self, url: str, payload: Any, payload_version: int) -> None:
+        """Сохранить результат разбора страницы (и версию парсера) рядом с её телом."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE http_cache SET payload = ?, payload_version = ? WHERE url = ?",
+                (json.dumps(payload, ensure_ascii=False), payload_version, url),
+            )
+            conn.commit()
+
+    def prune(self, max_entries: int) -> int:
+        """
+        Оставить в кэше не больше max_entries страниц, вытесняя те,
+        что дольше всего не запрашивались (LRU). Возвращает число удалённых.
+        """
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                """
+                DELETE FROM http_cache
+                WHERE url NOT IN (
+                    SELECT url FROM http_cache
+                    ORDER BY accessed_at DESC
+                    LIMIT ?
+                )
+                """,
+                (max_entries,),
+            )
+            conn.commit()
+            return cur.rowcount
+
+
+def _loads(payload_json: Optional[str]) -> Any:
+    return json.loads(payload_json) if payload_json is not None else None
@@ -0,0 +1,82 @@
+"""
+Общая настройка requests.Session для скрейперов.
+
+Сессия держит keep-alive соединения в пуле (без нового TCP/TLS-рукопожатия
+на каждый запрос) и сама повторяет запросы на временных ошибках шлюза.
+Если передан TokenBucket, каждый запрос сессии проходит через него.
+"""
+
+from typing import Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .rate_limit import TokenBucket
+
+POOL_SIZE = 20
+
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Ответы, которыми сайт просит снизить частоту запросов
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+class _RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter, который перед отправкой берёт токен из общего ведра."""
+
+    def __init__(self, bucket: TokenBucket, **kwargs) -> None:
+        self.bucket = bucket
+        super().__init__(**kwargs)
+
+    def send(self, request, *args, **kwargs):
+        self.bucket.acquire()
+        resp = super().send(request, *args, **kwargs)
+
+        # повторы urllib3 идут внутри send, поэтому смотрим и их историю
+        retries = getattr(resp.raw, "retries", None)
+        history = retries.history if retries is not None else ()
+        if resp.status_code in THROTTLE_STATUSES or any(
+            h.status in THROTTLE_STATUSES for h in history
+        ):
+            self.bucket.penalize()
+        else:
+            self.bucket.reward()
+        return resp
+
+
+def make_session(
+    headers: Mapping[str, str],
+    rate_limit: Optional[TokenBucket] = None,
+) -> requests.Session:
+    """
+    Сессия с пулом соединений и повторами на 429/502/503/504
+    (с экспоненциальной паузой и с учётом Retry-After).
+
+    Если повторы не помогли, отдаётся последний ответ (raise_on_status=False),
+    чтобы вызывающий код, как и раньше, получал requests.HTTPError
+    из resp.raise_for_status().
+    """
+    session = requests.Session()
+    session.headers.update(headers)
+
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    adapter_kwargs = dict(
+        pool_connections=POOL_SIZE,
+        pool_maxsize=POOL_SIZE,
+        max_retries=retry,
+    )
+    if rate_limit is not None:
+        adapter = _RateLimitedAdapter(rate_limit, **adapter_kwargs)
+    else:
+        adapter = HTTPAdapter(**adapter_kwargs)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
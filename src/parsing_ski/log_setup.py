@@ -0,0 +1,46 @@
+"""
+Общая настройка логирования для точек входа (run_scapers.py, manage_data.py).
+
+Лог пишется в файл <base_dir>/logs/{mode}_YYYYMMDD_HHMMSS.log и в консоль.
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Один Formatter на все обработчики и все вызовы setup()
+_FORMATTER = logging.Formatter(LOG_FORMAT)
+
+
+def setup(mode: str, base_dir: Path) -> Path:
+    """
+    Настраивает корневой логгер: файл + консоль. Возвращает путь к лог-файлу.
+
+    Повторный вызов заменяет обработчики, а не добавляет новые,
+    поэтому сообщения не дублируются.
+    """
+    logs_dir = Path(base_dir) / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_path = logs_dir / f"{mode}_{ts}.log"
+
+    file_handler = logging.FileHandler(log_path, encoding="utf-8")
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(_FORMATTER)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(file_handler)
+    root.addHandler(console_handler)
+    root.setLevel(logging.INFO)
+
+    logging.getLogger(__name__).info(
+        "Логирование включено для режима '%s'. Файл: %s", mode, log_path
+    )
+    return log_path
@@ -1,4 +1,6 @@
 # models.py
+from __future__ import annotations
+
 from dataclasses import dataclass, field
 from typing import List, Optional
 
@@ -8,7 +10,10 @@ MIN_SKI_LENGTH_CM: int = 90
 MAX_SKI_LENGTH_CM: int = 210
 
 
-@dataclass
+# slots=True: без __dict__ на каждый экземпляр — скрейперы создают по Product
+# на каждую пару (url, размер), так что это заметно по памяти.
+# Произвольные атрибуты на Product вешать нельзя.
+@dataclass(slots=True)
 class Product:
     shop: str
     url: str
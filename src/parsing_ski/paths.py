@@ -0,0 +1,16 @@
+"""
+Пути проекта относительно его корня (.../parsing_ski).
+
+Корень вычисляется один раз при импорте, остальные модули берут
+каталоги отсюда.
+"""
+
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+DATA_DIR = ROOT_DIR / "data"
+
+# Итоговые CSV (skis_unified_*.csv) и diff-файлы
+EXPORT_DIR = DATA_DIR / "exports"
+# Кэши скрейперов (HTTP-кэш и т.п.)
+CACHE_DIR = DATA_DIR / "cache"
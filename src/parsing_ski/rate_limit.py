@@ -0,0 +1,71 @@
+"""
+Ограничение частоты запросов к одному сайту (token bucket).
+
+Ведро общее для всех потоков скрейпера: каждый запрос забирает один токен,
+токены копятся со скоростью rate в секунду, но не больше capacity.
+Если сайт отвечает 429 / 503, скорость уменьшается вдвое и потом
+понемногу восстанавливается на каждом успешном ответе.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        min_rate: Optional[float] = None,
+        recovery_step: Optional[float] = None,
+    ) -> None:
+        """
+        :param rate: обычная (максимальная) скорость, запросов в секунду
+        :param capacity: сколько запросов можно отправить разом после простоя
+        :param min_rate: ниже этой скорости не замедляемся (по умолчанию rate / 16)
+        :param recovery_step: прибавка к скорости за успешный ответ (по умолчанию rate / 20)
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.recovery_step = recovery_step if recovery_step is not None else rate / 20
+
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        # вызывается только под self._lock
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """
+        Забрать токен, при необходимости подождав.
+
+        Токен резервируется сразу (баланс может уйти в минус), поэтому
+        конкурирующие потоки встают в очередь, а не будят друг друга.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+    def penalize(self) -> None:
+        """Сайт просит притормозить (429 / 503): вдвое снижаем скорость."""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self) -> None:
+        """Успешный ответ: линейно возвращаемся к обычной скорости."""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
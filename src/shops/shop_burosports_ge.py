@@ -1,11 +1,18 @@
 # shop_burosports_ge.py
+import json
+import os
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Optional, Tuple, Dict
 from urllib.parse import urljoin
+from src.parsing_ski.http_session import make_session
 from src.parsing_ski.models import Product, MIN_SKI_LENGTH_CM, MAX_SKI_LENGTH_CM
+from src.parsing_ski.paths import CACHE_DIR
+from src.parsing_ski.rate_limit import TokenBucket
 
-import requests
+import soupsieve
 from bs4 import BeautifulSoup
 
 
@@ -14,6 +21,24 @@ BASE_DOMAIN = "https://burusports.ge"
 # Категория лыж (английская версия)
 CATEGORY_URL = f"{BASE_DOMAIN}/en/products/tkhilamuri/tkhilamuri"
 
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/119.0 Safari/537.36"
+    )
+}
+
+# Сколько карточек товаров (и страниц брендов) качаем параллельно
+DETAIL_WORKERS = 8
+
+# Сколько запросов в секунду шлём на сайт (все потоки вместе)
+REQUESTS_PER_SECOND = 5
+
+# Общая сессия: keep-alive, пул соединений, повторы на 429/502/503/504.
+# Паузы между запросами заменяет общее ведро токенов
+_SESSION = make_session(HEADERS, rate_limit=TokenBucket(REQUESTS_PER_SECOND))
+
 # Небольшой список брендов для попытки автоопределения по <title>
 KNOWN_BRANDS = [
     "Rossignol",
@@ -32,6 +57,17 @@ KNOWN_BRANDS = [
     "Dynastar",
     "Armada",
 ]
+# Бренды в нижнем регистре (в том же порядке), чтобы не lower() на каждый title
+_KNOWN_BRANDS_LOWER = [(b, b.lower()) for b in KNOWN_BRANDS]
+# Все бренды одной регуляркой по title.lower(). Lookahead находит вхождения
+# с каждой позиции (в том числе перекрывающиеся), а из найденных берём бренд,
+# стоящий в KNOWN_BRANDS раньше, — как при проходе по списку.
+_BRAND_RE = re.compile(
+    "(?=(" + "|".join(re.escape(b_lower) for _b, b_lower in _KNOWN_BRANDS_LOWER) + "))"
+)
+_BRAND_PRIORITY: Dict[str, Tuple[int, str]] = {
+    b_lower: (i, b) for i, (b, b_lower) in enumerate(_KNOWN_BRANDS_LOWER)
+}
 
 # Фильтры по брендам (английская версия каталога)
 BRAND_FILTER_URLS: Dict[str, str] = {
@@ -40,23 +76,37 @@ BRAND_FILTER_URLS: Dict[str, str] = {
     "Scott":     "https://burusports.ge/en/products/tkhilamuri/tkhilamuri?keyword=&sort=&discount=&brand%5B%5D=7",
 }
 
+# CSS-селекторы компилируем один раз на модуль, а не в каждом select()
+_SEL_PRODUCT_CARDS = soupsieve.compile("a.product-list-item")
+_SEL_MAIN_TITLE = soupsieve.compile("h1.main-title")
+
+# Регулярки компилируем один раз на модуль
+_WS_RE = re.compile(r"\s+")
+_PRICE_TOKEN_RE = re.compile(r"\d{3,4}")  # цена в карточке листинга: 2800, 1600
+_NON_DIGIT_RE = re.compile(r"[^\d\s]")  # '165სმ' -> '165 '
+_LEN_RE = re.compile(r"(\d{2,3})")
+_MODEL_LEN_RE = re.compile(r"(\d{3})")
+# Блок размеров: от первого 'Size:' до ближайшего стоп-слова (или конца текста)
+_SIZE_BLOCK_RE = re.compile(
+    r"Size:(.*?)(?:Adult:|Quantity:|Add to cart|Similar products|\Z)", re.S
+)
+
 # сюда сложим соответствия "нормализованное название модели" -> "бренд"
 BRAND_BY_MODEL: Dict[str, str] = {}
 
+# Карта "модель -> бренд" между запусками хранится на диске, чтобы
+# не обходить страницы фильтров брендов каждый раз
+BRAND_MAP_CACHE_PATH = CACHE_DIR / "burusports_brand_map.json"
+BRAND_MAP_TTL_SECONDS = 24 * 60 * 60
+
 
 def _get_soup(url: str) -> BeautifulSoup:
     """Загружает страницу и возвращает BeautifulSoup."""
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/119.0 Safari/537.36"
-        )
-    }
-    resp = requests.get(url, headers=headers, timeout=20)
+    resp = _SESSION.get(url, timeout=20)
     resp.raise_for_status()
-    return BeautifulSoup(resp.text, "html.parser")
+    return BeautifulSoup(resp.text, "lxml")
 
+@lru_cache(maxsize=4096)
 def _normalize_model_name(name: str) -> str:
     """
     Нормализуем название модели:
@@ -64,71 +114,126 @@ def _normalize_model_name(name: str) -> str:
     - схлопываем лишние пробелы
     - lower()
     """
-    return re.sub(r"\s+", " ", (name or "").strip()).lower()
+    return _WS_RE.sub(" ", (name or "").strip()).lower()
 
 
-def _build_brand_model_map() -> None:
+def _brand_model_keys(base_url: str) -> List[str]:
     """
-    Один раз обходит страницы с фильтрами брендов
-    и заполняет BRAND_BY_MODEL.
+    Обходит все страницы фильтра одного бренда и возвращает
+    нормализованные названия моделей (в порядке появления).
     """
-    global BRAND_BY_MODEL
-    if BRAND_BY_MODEL:
-        return  # уже построили
+    keys: List[str] = []
+    page = 1
+    while True:
+        if page == 1:
+            url = base_url
+        else:
+            # пагинация у них через ?page=2, ?page=3 и т.п.
+            url = f"{base_url}&page={page}"
 
-    mapping: Dict[str, str] = {}
+        try:
+            soup = _get_soup(url)
+        except Exception as e:
+            print(f"[WARN] Failed to load brand page {url}: {e}")
+            break
 
-    for brand, base_url in BRAND_FILTER_URLS.items():
-        page = 1
-        while True:
-            if page == 1:
-                url = base_url
-            else:
-                # пагинация у них через ?page=2, ?page=3 и т.п.
-                url = f"{base_url}&page={page}"
+        card_links = _SEL_PRODUCT_CARDS.select(soup)
+        if not card_links:
+            break  # товаров нет -> дальше страниц нет
 
-            try:
-                soup = _get_soup(url)
-            except Exception as e:
-                print(f"[WARN] Failed to load brand page {url}: {e}")
-                break
+        for a in card_links:
+            full_text = a.get_text(" ", strip=True)
 
-            card_links = soup.select("a.product-list-item")
-            if not card_links:
-                break  # товаров нет -> дальше страниц нет
+            # Разбиваем на токены
+            tokens = full_text.split()
 
-            for a in card_links:
-                full_text = a.get_text(" ", strip=True)
+            # Убираем с конца максимум два "ценовых" токена (3–4 цифры)
+            prices_removed = 0
+            while tokens and prices_removed < 2 and _PRICE_TOKEN_RE.fullmatch(tokens[-1]):
+                tokens.pop()
+                prices_removed += 1
 
-                # Разбиваем на токены
-                tokens = full_text.split()
+            model_name = " ".join(tokens).strip()
 
-                # Убираем с конца максимум два "ценовых" токена (3–4 цифры)
-                prices_removed = 0
-                while tokens and prices_removed < 2 and re.fullmatch(r"\d{3,4}", tokens[-1]):
-                    tokens.pop()
-                    prices_removed += 1
+            key = _normalize_model_name(model_name)
+            if key:
+                keys.append(key)
 
-                model_name = " ".join(tokens).strip()
+        page += 1
 
-                key = _normalize_model_name(model_name)
-                if key and key not in mapping:
-                    mapping[key] = brand
+    return keys
 
-            page += 1
-            time.sleep(0.2)
+
+def _load_brand_model_map() -> Optional[Dict[str, str]]:
+    """Карта из BRAND_MAP_CACHE_PATH, если файл есть и моложе TTL, иначе None."""
+    try:
+        age = time.time() - BRAND_MAP_CACHE_PATH.stat().st_mtime
+        if age > BRAND_MAP_TTL_SECONDS:
+            return None
+        with BRAND_MAP_CACHE_PATH.open(encoding="utf-8") as f:
+            mapping = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[WARN] Ignoring broken brand map cache {BRAND_MAP_CACHE_PATH}: {e}")
+        return None
+    if not isinstance(mapping, dict):
+        return None
+    return mapping
+
+
+def _save_brand_model_map(mapping: Dict[str, str]) -> None:
+    """Пишет карту через временный файл, чтобы не оставить недописанный JSON."""
+    try:
+        BRAND_MAP_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = BRAND_MAP_CACHE_PATH.with_name(BRAND_MAP_CACHE_PATH.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(mapping, f, ensure_ascii=False)
+        os.replace(tmp_path, BRAND_MAP_CACHE_PATH)
+    except OSError as e:
+        print(f"[WARN] Failed to save brand map cache {BRAND_MAP_CACHE_PATH}: {e}")
+
+
+def _build_brand_model_map() -> None:
+    """
+    Один раз обходит страницы с фильтрами брендов
+    и заполняет BRAND_BY_MODEL.
+
+    Если на диске есть свежая карта (моложе BRAND_MAP_TTL_SECONDS) —
+    берём её без запросов к сайту.
+    """
+    global BRAND_BY_MODEL
+    if BRAND_BY_MODEL:
+        return  # уже построили
+
+    cached = _load_brand_model_map()
+    if cached:
+        BRAND_BY_MODEL = cached
+        print(f"[INFO] burusports: brand-model map loaded from cache, {len(BRAND_BY_MODEL)} entries")
+        return
+
+    mapping: Dict[str, str] = {}
+
+    # бренды качаем параллельно, а сливаем в порядке BRAND_FILTER_URLS:
+    # модель, попавшая в несколько фильтров, достаётся первому бренду
+    with ThreadPoolExecutor(max_workers=len(BRAND_FILTER_URLS) or 1) as ex:
+        brand_keys = ex.map(_brand_model_keys, BRAND_FILTER_URLS.values())
+        for brand, keys in zip(BRAND_FILTER_URLS, brand_keys):
+            for key in keys:
+                mapping.setdefault(key, brand)
 
     BRAND_BY_MODEL = mapping
+    # пустую карту (например, все страницы брендов упали) не кэшируем
+    if mapping:
+        _save_brand_model_map(mapping)
     print(f"[INFO] burusports: brand-model map built, {len(BRAND_BY_MODEL)} entries")
 
 
+@lru_cache(maxsize=4096)
 def _detect_brand(page_title: str) -> Optional[str]:
     """Пытаемся определить бренд по <title> страницы."""
-    title_lower = (page_title or "").lower()
-    for b in KNOWN_BRANDS:
-        if b.lower() in title_lower:
-            return b
-    return None
+    found = [_BRAND_PRIORITY[m.group(1)] for m in _BRAND_RE.finditer((page_title or "").lower())]
+    return min(found)[1] if found else None
 
 
 def _extract_prices_from_list_text(text: str) -> Tuple[Optional[float], Optional[float]]:
@@ -146,7 +251,7 @@ def _extract_prices_from_list_text(text: str) -> Tuple[Optional[float], Optional
     if not text:
         return None, None
 
-    nums = [m.group(0) for m in re.finditer(r"\d{3,4}", text)]
+    nums = [m.group(0) for m in _PRICE_TOKEN_RE.finditer(text)]
     if not nums:
         return None, None
 
@@ -169,38 +274,29 @@ def _extract_sizes_from_product_text(soup: BeautifulSoup) -> List[str]:
     """
     text = soup.get_text("\n", strip=True)
 
-    if "Size:" not in text:
+    m = _SIZE_BLOCK_RE.search(text)
+    if not m:
         return []
 
-    # Берём всё после первого 'Size:'
-    part = text.split("Size:", 1)[1]
-
-    # Обрезаем по первому встреченному "стоп-слову"
-    for stop in ("Adult:", "Quantity:", "Add to cart", "Similar products"):
-        if stop in part:
-            part = part.split(stop, 1)[0]
-
-    # Убираем всё, что не цифра и не пробел → '165სმ' превратится в '165 '
-    part_clean = re.sub(r"[^\d\s]", " ", part)
-
+    # Группы цифр ищем прямо в блоке: '165სმ' даёт '165' и без замены букв
+    # на пробелы, границы числа те же
     sizes: List[str] = []
-    for m in re.finditer(r"(\d{2,3})", part_clean):
-        value = m.group(1)
-        if value not in sizes:
+    seen = set()
+    for value in _LEN_RE.findall(m.group(1)):
+        if value not in seen:
+            seen.add(value)
             sizes.append(value)
 
     return sizes
 
 
-def _parse_product_page(
-    url: str,
-    list_old_price: Optional[float],
-    list_current_price: Optional[float],
-) -> Optional[Product]:
-    """
-    Парсим страницу конкретного товара.
+# Что берём со страницы товара: (model, brand, sizes)
+ProductDetails = Tuple[str, Optional[str], List[str]]
 
-    ЦЕНЫ мы сюда уже передаём с листинговой страницы (list_old_price, list_current_price).
+
+def _load_product_details(url: str) -> Optional[ProductDetails]:
+    """
+    Загружаем и разбираем страницу конкретного товара.
 
     Из карточки товара вытаскиваем:
     - model: из <h1.main-title>
@@ -214,7 +310,7 @@ def _parse_product_page(
         return None
 
     # Название модели
-    h1 = soup.select_one("h1.main-title")
+    h1 = _SEL_MAIN_TITLE.select_one(soup)
     if not h1:
         print(f"[WARN] No <h1> found on product page {url}")
         return None
@@ -227,12 +323,26 @@ def _parse_product_page(
 
     # Если в словаре нет — пробуем по <title>
     if not brand:
-        page_title = soup.title.string if soup.title else ""
+        # str(): в кэш _detect_brand кладём обычную строку, а не NavigableString,
+        # которая держит ссылку на всё дерево страницы
+        page_title = str(soup.title.string or "") if soup.title else ""
         brand = _detect_brand(page_title)
 
     # Размеры (Size) – просто собираем все ссылки в блоке размеров
     sizes = _extract_sizes_from_product_text(soup)
 
+    return model, brand, sizes
+
+
+def _make_product(
+    url: str,
+    details: ProductDetails,
+    list_old_price: Optional[float],
+    list_current_price: Optional[float],
+) -> Product:
+    """Product из разобранной страницы товара и цен с листинга."""
+    model, brand, sizes = details
+
     # Цены берём только с листинга
     old_price = list_old_price
     current_price = list_current_price or list_old_price
@@ -248,13 +358,14 @@ def _parse_product_page(
         url=url,
         brand=brand,
         model=model,
-        sizes=sizes,
+        sizes=list(sizes),
         current_price=current_price,
         old_price=old_price,
         condition="new",
     )
     return product
 
+
 def product_to_unified_rows(p: Product) -> List[dict]:
     rows: List[dict] = []
 
@@ -262,12 +373,14 @@ def product_to_unified_rows(p: Product) -> List[dict]:
 
     # парсим длины из p.sizes, например "185", "185სმ", "176 см"
     lengths: List[int] = []
+    seen = set()
     for s in sizes:
         # оставляем только цифры и пробелы
-        clean = re.sub(r"[^\d\s]", " ", s or "")
-        for m in re.finditer(r"(\d{2,3})", clean):
+        clean = _NON_DIGIT_RE.sub(" ", s or "")
+        for m in _LEN_RE.finditer(clean):
             L = int(m.group(1))
-            if MIN_SKI_LENGTH_CM <= L <= MAX_SKI_LENGTH_CM and L not in lengths:
+            if MIN_SKI_LENGTH_CM <= L <= MAX_SKI_LENGTH_CM and L not in seen:
+                seen.add(L)
                 lengths.append(L)
 
     # если удалось достать длины из sizes — делаем по строке на каждую длину
@@ -288,7 +401,7 @@ def product_to_unified_rows(p: Product) -> List[dict]:
         return rows
 
     # fallback, если sizes пустой — пробуем выдернуть длину из model
-    m = re.search(r"(\d{3})", p.model or "")
+    m = _MODEL_LEN_RE.search(p.model or "")
     L = None
     if m:
         L = int(m.group(1))
@@ -311,6 +424,15 @@ def product_to_unified_rows(p: Product) -> List[dict]:
     return rows
 
 
+def _load_product_details_safe(url: str) -> Optional[ProductDetails]:
+    """_load_product_details для пула потоков: ошибка разбора не роняет всю страницу."""
+    try:
+        return _load_product_details(url)
+    except Exception as e:
+        print(f"[WARN] Failed to parse product {url}: {e}")
+        return None
+
+
 def scrape_burosports(test_mode: bool = False) -> List[Product]:
     """
     Основная точка входа.
@@ -325,61 +447,66 @@ def scrape_burosports(test_mode: bool = False) -> List[Product]:
     _build_brand_model_map()
 
     products: List[Product] = []
+    # Разобранные страницы товаров за этот запуск: при сдвиге пагинации
+    # (или повторе карточки на странице) товар не качаем второй раз
+    details_by_url: Dict[str, Optional[ProductDetails]] = {}
     page = 1
 
-    while True:
-        if page == 1:
-            url = CATEGORY_URL
-        else:
-            url = f"{CATEGORY_URL}?page={page}"
-
-        print(f"[INFO] burusports page={page} url={url}")
-
-        try:
-            soup = _get_soup(url)
-        except Exception as e:
-            print(f"[WARN] Failed to load category page {url}: {e}")
-            break
-
-        # Карточки товаров на странице (каждая содержит название и 1–2 числа цен)
-        card_links = soup.select("a.product-list-item")
-        if not card_links:
-            # Пустая страница -> достигли конца
-            print(f"[INFO] No products found on page {page}, stopping.")
-            break
-
-        for a in card_links:
-            href = a.get("href")
-            if not href:
-                continue
-            product_url = urljoin(BASE_DOMAIN, href)
+    with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as ex:
+        while True:
+            if page == 1:
+                url = CATEGORY_URL
+            else:
+                url = f"{CATEGORY_URL}?page={page}"
 
-            # Текст карточки: 'Escaper 97 Nano 2800 1600'
-            text = a.get_text(" ", strip=True)
-            list_old_price, list_current_price = _extract_prices_from_list_text(text)
+            print(f"[INFO] burusports page={page} url={url}")
 
             try:
-                product = _parse_product_page(
-                    product_url,
-                    list_old_price=list_old_price,
-                    list_current_price=list_current_price,
-                )
-                if product:
-                    products.append(product)
+                soup = _get_soup(url)
             except Exception as e:
-                print(f"[WARN] Failed to parse product {product_url}: {e}")
+                print(f"[WARN] Failed to load category page {url}: {e}")
+                break
 
-            # Небольшая пауза, чтобы не долбить сайт
-            time.sleep(0.3)
+            # Карточки товаров на странице (каждая содержит название и 1–2 числа цен)
+            card_links = _SEL_PRODUCT_CARDS.select(soup)
+            if not card_links:
+                # Пустая страница -> достигли конца
+                print(f"[INFO] No products found on page {page}, stopping.")
+                break
 
-        if test_mode:
-            # В тестовом режиме только первая страница
-            print("[INFO] Test mode is ON, stopping after first page.")
-            break
+            cards: List[Tuple[str, Optional[float], Optional[float]]] = []
+            for a in card_links:
+                href = a.get("href")
+                if not href:
+                    continue
+                product_url = urljoin(BASE_DOMAIN, href)
+
+                # Текст карточки: 'Escaper 97 Nano 2800 1600'
+                text = a.get_text(" ", strip=True)
+                cards.append((product_url, *_extract_prices_from_list_text(text)))
+
+            # новые карточки страницы качаем параллельно (частоту держит _SESSION)
+            new_urls = list(
+                dict.fromkeys(u for u, _old, _cur in cards if u not in details_by_url)
+            )
+            details_by_url.update(zip(new_urls, ex.map(_load_product_details_safe, new_urls)))
+
+            # цены у каждой карточки свои, с листинга
+            for product_url, list_old_price, list_current_price in cards:
+                details = details_by_url[product_url]
+                if details is not None:
+                    products.append(
+                        _make_product(product_url, details, list_old_price, list_current_price)
+                    )
+
+            if test_mode:
+                # В тестовом режиме только первая страница
+                print("[INFO] Test mode is ON, stopping after first page.")
+                break
 
-        page += 1
-        # небольшая пауза между страницами
-        time.sleep(0.5)
+            page += 1
+            # небольшая пауза между страницами
+            time.sleep(0.5)
 
     print(f"[INFO] burusports: {len(products)} products scraped")
     return products
@@ -1,13 +1,19 @@
 # shop_extreme_ge.py
-import time
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Optional
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse, urljoin
 
+import lxml.html
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 
+from src.parsing_ski.http_cache import HttpCache
+from src.parsing_ski.http_session import make_session
 from src.parsing_ski.models import Product
+from src.parsing_ski.rate_limit import TokenBucket
 
 
 BASE_URL = "https://www.xtreme.ge/en/shop/category/ski-skis-2"
@@ -23,22 +29,102 @@ HEADERS = {
 
 SHOP_NAME = "xtreme.ge"
 
+# Сколько карточек товаров качаем параллельно
+DETAIL_WORKERS = 8
+# Сколько запросов в секунду шлём на сайт (все потоки вместе).
+# Раньше карточки шли по одной с паузой 0.3 с — это меньше 3 запросов в секунду;
+# выше не поднимаем, чтобы пул потоков не увеличил нагрузку на чужой сайт
+REQUESTS_PER_SECOND = 3
 
-def get_soup(url: str) -> BeautifulSoup:
-    resp = requests.get(url, headers=HEADERS, timeout=20)
-    resp.raise_for_status()
-    return BeautifulSoup(resp.text, "html.parser")
+# Общая сессия: keep-alive, пул соединений, повторы на 429/502/503/504.
+# Все запросы идут через одно ведро токенов, на 429/503 оно замедляется
+_SESSION = make_session(HEADERS, rate_limit=TokenBucket(REQUESTS_PER_SECOND))
+
+# Кэш страниц категории и карточек: условные запросы по ETag / Last-Modified
+_HTTP_CACHE = HttpCache()
+# Сколько страниц держим в кэше (лишние вытесняются по давности использования)
+HTTP_CACHE_MAX_ENTRIES = 20_000
+# Версия сохранённого разбора страниц: поднимать при любом изменении парсеров
+# ниже, иначе на неизменившихся страницах останется разбор старым кодом
+PAYLOAD_VERSION = 1
+
+# Регулярки для длин и цен — компилируем один раз на модуль
+_RE_NON_DIGITS = re.compile(r"\D+")
+_RE_PRICE = re.compile(r"([\d.,]+)")
+
+
+def _has_class(name: str) -> str:
+    """XPath-условие «у элемента есть класс name» (аналог CSS .name)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Страница категории: карточки товаров и ссылки в них.
+# Если класса карточки нет даже в сыром HTML, разбирать страницу незачем
+_PRODUCT_CARD_MARKER = "oe_product"
+_XP_PRODUCT = etree.XPath(f"//div[{_has_class('oe_product')}]")
+_XP_PRODUCT_LINK = etree.XPath(f"(.//a[{_has_class('oe_product_image_link')}])[1]")
+_XP_PRODUCT_TITLE_LINK = etree.XPath(
+    f"(.//h6[{_has_class('o_wsale_products_item_title')}]//a)[1]"
+)
+
+# Карточка товара: разбираем lxml-деревом по заранее скомпилированным XPath
+_X_TITLE = f"//h1[{_has_class('o_wsale_product_page_title')}]"
+_XP_BRAND = etree.XPath(f"({_X_TITLE}//*[{_has_class('brand-name-detail')}]//span)[1]")
+_XP_MODEL = etree.XPath(f"({_X_TITLE}//*[{_has_class('product-name-detail')}]//span)[1]")
+_XP_FIRST_H1 = etree.XPath("(//h1)[1]")
+
+_X_PRICE_SPAN = f"//div[{_has_class('product_price')}]//span[{_has_class('oe_price')}]"
+_XP_PRICE_NEW = etree.XPath(f"({_X_PRICE_SPAN}[{_has_class('text-danger')}])[1]")
+_XP_PRICE_OLD = etree.XPath(f"({_X_PRICE_SPAN}[{_has_class('text-muted')}])[1]")
+_XP_PRICE_ANY = etree.XPath(f"({_X_PRICE_SPAN})[1]")
+_XP_PRICE_ITEMPROP = etree.XPath("(//span[@itemprop='price'])[1]")
+
+_XP_SIZE_BADGES = etree.XPath(
+    f"//div[{_has_class('main-product-sizes-grid')}]"
+    f"//span[{_has_class('main-size-badge')}]"
+    f" | //div[{_has_class('alternative-product-sizes-grid')}]"
+    f"//span[{_has_class('alternative-size-badge-clickable')}]"
+)
+
+_XP_TEXTS = etree.XPath(".//text()")
+
+
+def _first(xp: etree.XPath, tree):
+    found = xp(tree)
+    return found[0] if found else None
+
+
+def _node_text(el) -> str:
+    """Аналог BeautifulSoup get_text(strip=True): склеиваем обрезанные куски текста."""
+    return "".join(t.strip() for t in _XP_TEXTS(el))
 
 
 # ---------- LIST PAGES ----------
 
 
+@lru_cache(maxsize=8)
+def _parsed_base(base_url: str):
+    """urlparse для base_url: он один на весь обход, разбираем его один раз."""
+    return urlparse(base_url)
+
+
+def _join_url(base_url: str, href: str) -> str:
+    """
+    urljoin с быстрым путём для ссылок от корня сайта ('/en/shop/...'):
+    их достаточно приклеить к схеме и домену base_url.
+    """
+    if href.startswith("/") and not href.startswith("//") and "/." not in href:
+        base = _parsed_base(base_url)
+        return f"{base.scheme}://{base.netloc}{href}"
+    return urljoin(base_url, href)
+
+
 def _normalize_page_url(url: str, base_url: str) -> str:
     """
     Убираем всякий мусор из query-параметров, чтобы ссылки не дублировались.
     """
     parsed = urlparse(url)
-    base_parsed = urlparse(base_url)
+    base_parsed = _parsed_base(base_url)
 
     # нормализуем схему/домен, если вдруг относительные
     scheme = parsed.scheme or base_parsed.scheme
@@ -64,43 +150,64 @@ def _normalize_page_url(url: str, base_url: str) -> str:
     return normalized
 
 
-def extract_product_links_from_soup(soup: BeautifulSoup, base_url: str) -> List[str]:
+def extract_product_links_from_html(html: str, base_url: str) -> List[str]:
     """
     Из HTML категории вытаскиваем ссылки на карточки товаров.
     Под текущую верстку xtreme (Odoo) товары лежат в .oe_product.
     """
+    tree = lxml.html.document_fromstring(html)
     links: List[str] = []
 
     # Каждый товар — div.oe_product
-    for product in soup.select("div.oe_product"):
+    for product in _XP_PRODUCT(tree):
         # Основная ссылка — по картинке
-        a = product.select_one("a.oe_product_image_link")
+        a = _first(_XP_PRODUCT_LINK, product)
         if a is None:
             # fallback — по заголовку
-            a = product.select_one("h6.o_wsale_products_item_title a")
-        if not a:
+            a = _first(_XP_PRODUCT_TITLE_LINK, product)
+        if a is None:
             continue
 
         href = a.get("href")
         if not href:
             continue
 
-        full_url = urljoin(base_url, href)
+        full_url = _join_url(base_url, href)
         # Нормализуем URL (убираем лишние query-параметры и т.п.)
         full_url = _normalize_page_url(full_url, base_url)
         links.append(full_url)
 
-    unique_links = sorted(set(links))
-    return unique_links
+    # dedup с сохранением порядка на странице (O(N), без сортировки)
+    return list(dict.fromkeys(links))
+
+
+def _list_page_links(url: str, base_url: str) -> tuple[List[str], str]:
+    """
+    Ссылки на товары со страницы категории + её HTML.
+
+    Страница идёт через HTTP-кэш: если она не изменилась (304 или то же тело),
+    берём ранее разобранные ссылки и HTML не разбираем вовсе.
+    """
+    cached = _HTTP_CACHE.fetch(_SESSION, url, timeout=20, payload_version=PAYLOAD_VERSION)
+    if cached.unchanged and cached.payload is not None:
+        return cached.payload, cached.text
+
+    # без разметки карточек (страница за последней) дерево не строим
+    if _PRODUCT_CARD_MARKER not in cached.text:
+        return [], cached.text
+
+    links = extract_product_links_from_html(cached.text, base_url)
+    _HTTP_CACHE.store_payload(url, links, PAYLOAD_VERSION)
+    return links, cached.text
 
 
 def parse_all_list_pages(base_url: str, max_pages: Optional[int] = None) -> List[str]:
-    all_product_urls: set[str] = set()
+    # dict вместо set: уникальность + порядок обнаружения ссылок
+    all_product_urls: dict[str, None] = {}
 
     page = 1
     print(f"[INFO] Fetch page {page}: {base_url}")
-    soup = get_soup(base_url)
-    page_links = extract_product_links_from_soup(soup, base_url)
+    page_links, html = _list_page_links(base_url, base_url)
     first_page_count = len(page_links)
     print(f"[INFO] Found {first_page_count} product links on page {page}")
 
@@ -108,13 +215,13 @@ def parse_all_list_pages(base_url: str, max_pages: Optional[int] = None) -> List
         print("[WARN] No product links found on first page.")
         try:
             with open("debug_xtreme_page_1.html", "w", encoding="utf-8") as f:
-                f.write(soup.prettify())
+                f.write(BeautifulSoup(html, "lxml").prettify())
             print("[DEBUG] Saved HTML of first page to debug_xtreme_page_1.html")
         except Exception as e:
             print(f"[DEBUG] Failed to save first page HTML: {e}")
         return []
 
-    all_product_urls.update(page_links)
+    all_product_urls.update(dict.fromkeys(page_links))
 
     page = 2
     while True:
@@ -126,7 +233,7 @@ def parse_all_list_pages(base_url: str, max_pages: Optional[int] = None) -> List
         print(f"[INFO] Fetch page {page}: {next_url}")
 
         try:
-            soup = get_soup(next_url)
+            new_links, _ = _list_page_links(next_url, base_url)
         except requests.HTTPError as e:
             status = e.response.status_code if e.response is not None else None
             print(f"[INFO] Stop on page={page}, HTTP {status}")
@@ -135,13 +242,12 @@ def parse_all_list_pages(base_url: str, max_pages: Optional[int] = None) -> List
             print(f"[WARN] Failed to fetch page {page}: {e}")
             break
 
-        new_links = extract_product_links_from_soup(soup, base_url)
         if not new_links:
             print(f"[INFO] No product links on page {page}, stop.")
             break
 
         before = len(all_product_urls)
-        all_product_urls.update(new_links)
+        all_product_urls.update(dict.fromkeys(new_links))
         after = len(all_product_urls)
         delta = after - before
 
@@ -156,9 +262,8 @@ def parse_all_list_pages(base_url: str, max_pages: Optional[int] = None) -> List
             break
 
         page += 1
-        time.sleep(1.0)
 
-    return sorted(all_product_urls)
+    return list(all_product_urls)
 
 
 # ---------- HELPERS: length & price ----------
@@ -167,45 +272,39 @@ def parse_all_list_pages(base_url: str, max_pages: Optional[int] = None) -> List
 def _clean_length_text(text: str) -> str:
     if not text:
         return ""
-    digits = re.sub(r"\D+", "", text)
+    digits = _RE_NON_DIGITS.sub("", text)
     return digits or ""
 
 
-def split_price(text: str) -> tuple[str, str]:
+# Разделители тысяч, которые выкидываем из числа перед float()
+_PRICE_STRIP = str.maketrans("", "", " ,")
+
+
+def _parse_price(text: str) -> tuple[Optional[float], str]:
     """
-    Разделяем цену на число и валюту.
-    Возвращаем (число_как_строка, строка_валюты).
+    Разбираем цену за один проход: (число_или_None, строка_валюты).
+
+    Число — первая группа цифр/точек/запятых, запятые считаем разделителями
+    тысяч ('1,299.00 ₾' -> 1299.0). Валюта — 'GEL', если есть '₾',
+    иначе остаток строки без числа ('USD 12' -> 'USD').
     """
     if not text or text == "N/A":
-        return "", ""
+        return None, ""
 
     raw = text.strip()
-    m = re.search(r"([\d.,]+)", raw)
-    number = ""
-    if m:
-        number = m.group(1).replace(" ", "")
+    m = _RE_PRICE.search(raw)
 
-    currency = ""
     if "₾" in raw:
         currency = "GEL"
     else:
-        rest = raw.replace(m.group(1), "") if m else raw
-        rest = rest.replace("₾", "").strip()
-        if rest:
-            currency = rest
-
-    return number, currency
-
+        currency = (raw.replace(m.group(1), "") if m else raw).strip()
 
-def _price_to_float(value: str) -> Optional[float]:
-    if not value:
-        return None
-    # remove thousands separators, keep decimal point
-    normalized = value.replace(" ", "").replace(",", "")
+    if not m:
+        return None, currency
     try:
-        return float(normalized)
+        return float(m.group(1).translate(_PRICE_STRIP)), currency
     except ValueError:
-        return None
+        return None, currency
 
 
 # ---------- PRODUCT PAGE ----------
@@ -215,9 +314,15 @@ def parse_product_page(url: str) -> dict:
     """
     Заходим на страницу товара и вытаскиваем:
     бренд, модель, сырые цены (со строками), размеры.
+
+    Если карточка не изменилась с прошлого запуска (304 / то же тело),
+    возвращаем сохранённый разбор, не трогая HTML.
     """
     try:
-        soup = get_soup(url)
+        cached = _HTTP_CACHE.fetch(_SESSION, url, timeout=20, payload_version=PAYLOAD_VERSION)
+        if cached.unchanged and cached.payload is not None:
+            return cached.payload
+        tree = lxml.html.document_fromstring(cached.text)
     except Exception as e:
         print(f"[ERROR] Failed to load {url}: {e}")
         return {
@@ -230,20 +335,16 @@ def parse_product_page(url: str) -> dict:
         }
 
     # --- бренд / модель ---
-    brand_tag = soup.select_one(
-        "h1.o_wsale_product_page_title .brand-name-detail span"
-    )
-    model_tag = soup.select_one(
-        "h1.o_wsale_product_page_title .product-name-detail span"
-    )
+    brand_tag = _first(_XP_BRAND, tree)
+    model_tag = _first(_XP_MODEL, tree)
 
-    brand = brand_tag.get_text(strip=True) if brand_tag else "N/A"
-    model = model_tag.get_text(strip=True) if model_tag else "N/A"
+    brand = _node_text(brand_tag) if brand_tag is not None else "N/A"
+    model = _node_text(model_tag) if model_tag is not None else "N/A"
 
     if brand == "N/A" and model == "N/A":
-        title_tag = soup.find("h1")
-        if title_tag:
-            parts = [t.strip() for t in title_tag.stripped_strings if t.strip()]
+        title_tag = _first(_XP_FIRST_H1, tree)
+        if title_tag is not None:
+            parts = [t.strip() for t in _XP_TEXTS(title_tag) if t.strip()]
             title = " ".join(parts)
             # простая эвристика: попробуем разделить по первому слову
             tokens = title.split()
@@ -254,36 +355,31 @@ def parse_product_page(url: str) -> dict:
     full_title = f"{brand} {model}".strip() if (brand != "N/A" or model != "N/A") else "N/A"
 
     # --- цены (сырые строки, дальше разбираем отдельно) ---
-    price_new_tag = soup.select_one("div.product_price span.oe_price.text-danger")
-    price_old_tag = soup.select_one("div.product_price span.oe_price.text-muted")
+    price_new_tag = _first(_XP_PRICE_NEW, tree)
+    price_old_tag = _first(_XP_PRICE_OLD, tree)
 
-    price_new_raw = price_new_tag.get_text(strip=True) if price_new_tag else "N/A"
-    price_old_raw = price_old_tag.get_text(strip=True) if price_old_tag else "N/A"
+    price_new_raw = _node_text(price_new_tag) if price_new_tag is not None else "N/A"
+    price_old_raw = _node_text(price_old_tag) if price_old_tag is not None else "N/A"
 
     # fallback, если скидки нет и красной цены нет
     if price_new_raw == "N/A":
-        price_new_tag2 = soup.select_one("div.product_price span.oe_price")
-        if not price_new_tag2:
-            price_new_tag2 = soup.select_one("span[itemprop='price']")
-        if price_new_tag2:
-            price_new_raw = price_new_tag2.get_text(strip=True)
+        price_new_tag2 = _first(_XP_PRICE_ANY, tree)
+        if price_new_tag2 is None:
+            price_new_tag2 = _first(_XP_PRICE_ITEMPROP, tree)
+        if price_new_tag2 is not None:
+            price_new_raw = _node_text(price_new_tag2)
 
     # --- размеры ---
-    size_main_tags = soup.select("div.main-product-sizes-grid span.main-size-badge")
-    size_alt_tags = soup.select(
-        "div.alternative-product-sizes-grid span.alternative-size-badge-clickable"
-    )
-
     all_size_texts: list[str] = []
-    for t in size_main_tags + size_alt_tags:
-        val = t.get("title") or t.get_text(strip=True)
+    for t in _XP_SIZE_BADGES(tree):
+        val = t.get("title") or _node_text(t)
         val = _clean_length_text(val)
         if val:
             all_size_texts.append(val)
 
     sizes = sorted(set(all_size_texts))
 
-    return {
+    detail = {
         "brand": brand if brand else "N/A",
         "model": model if model else "N/A",
         "full_name": full_title if full_title else "N/A",
@@ -291,6 +387,8 @@ def parse_product_page(url: str) -> dict:
         "price_old_raw": price_old_raw or "N/A",
         "sizes": sizes,
     }
+    _HTTP_CACHE.store_payload(url, detail, PAYLOAD_VERSION)
+    return detail
 
 
 # ---------- PUBLIC API ----------
@@ -317,17 +415,24 @@ def scrape_xtreme(
     product_urls = parse_all_list_pages(BASE_URL, max_pages=effective_max_pages)
     print(f"[INFO] Total unique product URLs: {len(product_urls)}")
 
-    products: List[Product] = []
+    total = len(product_urls)
+
+    def _fetch(item: tuple[int, str]) -> dict:
+        idx, url = item
+        print(f"[INFO] [{idx}/{total}] Parse product: {url}")
+        return parse_product_page(url)
 
-    for idx, url in enumerate(product_urls, start=1):
-        print(f"[INFO] [{idx}/{len(product_urls)}] Parse product: {url}")
-        detail = parse_product_page(url)
+    # Карточки качаем пулом потоков; map сохраняет порядок product_urls
+    with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as ex:
+        details = list(ex.map(_fetch, enumerate(product_urls, start=1)))
 
-        price_new_num, currency = split_price(detail["price_new_raw"])
-        price_old_num, _ = split_price(detail["price_old_raw"])
+    _HTTP_CACHE.prune(HTTP_CACHE_MAX_ENTRIES)
 
-        current_price = _price_to_float(price_new_num)
-        old_price = _price_to_float(price_old_num)
+    products: List[Product] = []
+
+    for url, detail in zip(product_urls, details):
+        current_price, currency = _parse_price(detail["price_new_raw"])
+        old_price, _ = _parse_price(detail["price_old_raw"])
 
         sizes = detail.get("sizes") or []
         if not sizes:
@@ -351,8 +456,6 @@ def scrape_xtreme(
             )
             products.append(p)
 
-        time.sleep(0.3)
-
     print(f"[OK] Finished {SHOP_NAME}, total rows: {len(products)}")
     return products
 
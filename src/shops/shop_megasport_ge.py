@@ -1,11 +1,16 @@
 # shop_megasport_ge.py
+import asyncio
 import logging
+import multiprocessing
 import re
-from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+import soupsieve
+from bs4 import BeautifulSoup, NavigableString, Tag
+from playwright.async_api import BrowserContext, Route, async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 from src.parsing_ski.models import Product, MIN_SKI_LENGTH_CM, MAX_SKI_LENGTH_CM
 
@@ -17,27 +22,41 @@ CATEGORY_URL = f"{BASE}/category/skiing"
 # Ищем цены вида "3 550,00 ₾"
 PRICE_RE = re.compile(r"([\d.,]+)\s*₾")
 SIZE_RE = re.compile(r"\b(\d{3})\b")  # 3-значные длины типа 160, 174 и т.п.
+_PRICE_JUNK_RE = re.compile(r"[^\d,.]")
+_PRICE_SEP_RE = re.compile(r"[,.]")
+# Основной блок цены на карточке; селектор компилируем один раз на модуль
+_SEL_PRICE_BLOCK = soupsieve.compile("div.text-primary.text-heading.font-semibold")
+
+# Сколько карточек товаров открываем одновременно (вкладок в браузере)
+DETAIL_PAGES = 6
+# Сколько ждём отрисовки нужных элементов после domcontentloaded, мс
+RENDER_TIMEOUT_MS = 10_000
+# По этим элементам понимаем, что страница дорисовалась
+PRODUCT_LINK_SELECTOR = 'a[href*="/products/"]'
+PRODUCT_NAME_SELECTOR = "h2[class*='text-heading']"
+
+# С какого числа карточек разбираем HTML пулом процессов (меньше — дороже старт пула)
+PARALLEL_PARSE_MIN_PAGES = 40
+PARALLEL_PARSE_CHUNKSIZE = 8
+
+# Что браузеру грузить не нужно: парсеру хватает HTML, JS и XHR
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+BLOCKED_URL_PARTS = ("google-analytics", "googletagmanager", "doubleclick", "facebook")
 
 
 # ---------- Вспомогательные функции ----------
 
-def _extract_product_links_from_html(html: str) -> List[str]:
+def _add_product_links(hrefs: Iterable[Optional[str]], seen: Dict[str, None]) -> int:
     """
-    Находит все ссылки на товары вида /products/...
+    Добавляет в seen ссылки на товары вида /products/... (полные URL,
+    в порядке появления). Возвращает, сколько из них новых.
     """
-    soup = BeautifulSoup(html, "html.parser")
-    links: List[str] = []
-
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        if "/products/" not in href:
+    before = len(seen)
+    for href in hrefs:
+        if not href or "/products/" not in href:
             continue
-        full = urljoin(BASE, href)
-        links.append(full)
-
-    uniq = sorted(set(links))
-    logger.info(f"megasport: found {len(uniq)} product links on category page")
-    return uniq
+        seen.setdefault(urljoin(BASE, href), None)
+    return len(seen) - before
 
 
 def _parse_price_number(raw: str) -> Optional[float]:
@@ -52,13 +71,13 @@ def _parse_price_number(raw: str) -> Optional[float]:
         return None
 
     # оставляем только цифры, точку и запятую
-    cleaned = re.sub(r"[^\d,\.]", "", raw)
+    cleaned = _PRICE_JUNK_RE.sub("", raw)
     if not cleaned:
         return None
 
     # считаем, что последняя точка/запятая — разделитель копеек/центов,
     # дробную часть просто отбрасываем
-    integer_part = re.split(r"[,.]", cleaned)[0]
+    integer_part = _PRICE_SEP_RE.split(cleaned, 1)[0]
     if not integer_part:
         return None
 
@@ -68,6 +87,30 @@ def _parse_price_number(raw: str) -> Optional[float]:
         return None
 
 
+def _iter_price_tags(soup: BeautifulSoup) -> Iterator[Tag]:
+    """
+    span/div, в тексте которых может быть '₾', в порядке документа — тот же
+    порядок, что у soup.find_all(["span", "div"]), но без списка всех тегов.
+
+    ₾ есть в тексте тега, только если он есть в одной из его строк, поэтому
+    идём по строкам лениво и для каждой строки с ₾ отдаём её ещё не
+    встречавшихся span/div-предков сверху вниз. Обход останавливается,
+    как только вызывающий нашёл цену.
+    """
+    seen = set()
+    for s in soup.descendants:
+        if not isinstance(s, NavigableString) or "₾" not in s:
+            continue
+        chain: List[Tag] = []
+        for parent in s.parents:
+            if id(parent) in seen:
+                break  # выше уже всё отдали
+            seen.add(id(parent))
+            if parent.name in ("span", "div"):
+                chain.append(parent)
+        yield from reversed(chain)
+
+
 def _extract_single_price(soup: BeautifulSoup) -> Optional[float]:
     """
     Возвращает ОДНУ цену (float) или None.
@@ -78,7 +121,7 @@ def _extract_single_price(soup: BeautifulSoup) -> Optional[float]:
       3) Если всё ещё нет — fallback по regex по всему тексту страницы.
     """
     # 1) Основной вариант: новый блок с ценой
-    block = soup.select_one("div.text-primary.text-heading.font-semibold")
+    block = _SEL_PRICE_BLOCK.select_one(soup)
     if block:
         txt = block.get_text(" ", strip=True)
         val = _parse_price_number(txt)
@@ -86,7 +129,7 @@ def _extract_single_price(soup: BeautifulSoup) -> Optional[float]:
             return val
 
     # 2) Любые span/дивы, где встречается символ ₾ — берём ПЕРВЫЙ
-    for tag in soup.find_all(["span", "div"]):
+    for tag in _iter_price_tags(soup):
         txt = tag.get_text(" ", strip=True)
         if "₾" not in txt:
             continue
@@ -107,7 +150,7 @@ def _parse_product_html(html: str, url: str) -> Optional[Product]:
     """
     Парсит HTML одной карточки товара и возвращает Product.
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml")
 
     # ---- название ----
     h2 = soup.find("h2", class_=lambda c: c and "text-heading" in c)
@@ -139,6 +182,7 @@ def _parse_product_html(html: str, url: str) -> Optional[Product]:
 
     # ---- длины (выбираем лыжи) ----
     sizes: List[int] = []
+    seen = set()
 
     # на сайте размеры обычно как кружочки-опции — ищем внутри ul с классом, содержащим "colors"
     ul = soup.find("ul", class_=lambda c: c and "colors" in c)
@@ -151,7 +195,8 @@ def _parse_product_html(html: str, url: str) -> Optional[Product]:
             length = int(m.group(1))
             if not (MIN_SKI_LENGTH_CM <= length <= MAX_SKI_LENGTH_CM):
                 continue
-            if length not in sizes:
+            if length not in seen:
+                seen.add(length)
                 sizes.append(length)
 
     # если вообще нет подходящих длин — считаем, что это не лыжи (ботинки/шлем и т.п.)
@@ -178,56 +223,165 @@ def _parse_product_html(html: str, url: str) -> Optional[Product]:
 
 # ---------- Основной раннер ----------
 
-def scrape_megasport(test_mode: bool = False) -> List[Product]:
-    """
-    Скрейпер Megasport с эмуляцией браузера:
+async def _block_heavy_resources(route: Route) -> None:
+    """Обрывает загрузку картинок, шрифтов, стилей и счётчиков аналитики."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        part in request.url for part in BLOCKED_URL_PARTS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
 
-    1. Открывает /category/skiing в Chromium через Playwright.
-    2. Жмёт кнопку "Load More" пока она есть (или 1 раз в test_mode).
-    3. Собирает все ссылки /products/...
-    4. По каждой ссылке открывает карточку и парсит товар.
-    5. Возвращает только те товары, где найдены "лыжные" длины.
+
+async def _collect_product_links(context: BrowserContext, test_mode: bool) -> List[str]:
     """
-    logger.info(f"Start scraping megasport.ge (test_mode={test_mode})")
+    Открывает категорию, жмёт "Load More" и собирает ссылки на товары.
 
-    items: List[Product] = []
+    Ссылки снимаем прямо из DOM после каждой подгрузки (только href, без
+    сериализации и разбора всей страницы) и копим в одном seen: так не теряем
+    карточки, даже если сайт при подгрузке убирает старые из списка.
+    """
+    seen: Dict[str, None] = {}
+    page = await context.new_page()
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    async def take_links() -> int:
+        hrefs = await page.eval_on_selector_all(
+            PRODUCT_LINK_SELECTOR, "els => els.map(e => e.getAttribute('href'))"
+        )
+        return _add_product_links(hrefs, seen)
 
+    try:
         # 1. Заходим в категорию SKIING
-        page.goto(CATEGORY_URL, wait_until="networkidle")
+        await page.goto(CATEGORY_URL, wait_until="domcontentloaded")
+        try:
+            await page.wait_for_selector(PRODUCT_LINK_SELECTOR, timeout=RENDER_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            logger.warning("megasport: no product cards rendered on category page")
+        await take_links()
 
         # 2. Жмём Load More
         max_clicks = 1 if test_mode else 20
         for _ in range(max_clicks):
-            btn = page.query_selector('button:has-text("Load More")')
-            if not btn or not btn.is_enabled():
+            btn = await page.query_selector('button:has-text("Load More")')
+            if not btn or not await btn.is_enabled():
                 break
+            cards_before = await page.locator(PRODUCT_LINK_SELECTOR).count()
             logger.info("megasport: click Load More")
-            btn.click()
-            # даём странице дорисоваться
-            page.wait_for_timeout(1500)
-
-        # 3. Собираем ссылки на товары
-        category_html = page.content()
-        product_links = _extract_product_links_from_html(category_html)
-
-        if test_mode:
-            product_links = product_links[:10]
-            logger.info(f"megasport: test_mode, limit to {len(product_links)} products")
-
-        # 4. Парсим каждую карточку
-        for url in product_links:
-            logger.info(f"megasport: parse product {url}")
-            page.goto(url, wait_until="networkidle")
-            html = page.content()
-            prod = _parse_product_html(html, url)
-            if prod:
-                items.append(prod)
-
-        browser.close()
+            await btn.click()
+            # ждём, пока дорисуются новые карточки, а не фиксированную паузу
+            try:
+                await page.wait_for_function(
+                    "([sel, n]) => document.querySelectorAll(sel).length > n",
+                    arg=[PRODUCT_LINK_SELECTOR, cards_before],
+                    timeout=RENDER_TIMEOUT_MS,
+                )
+            except PlaywrightTimeoutError:
+                logger.info("megasport: Load More brought no new products, stop")
+                break
+            if not await take_links():
+                logger.info("megasport: Load More brought no new product links, stop")
+                break
+    finally:
+        await page.close()
+
+    logger.info(f"megasport: found {len(seen)} product links on category page")
+    return list(seen)
+
+
+async def _load_product_htmls(
+    context: BrowserContext, urls: List[str]
+) -> List[Optional[str]]:
+    """
+    Открывает карточки товаров параллельно в DETAIL_PAGES вкладках.
+
+    Вкладки лежат в очереди: каждая загрузка берёт свободную и возвращает
+    её обратно, так что одновременно грузится не больше DETAIL_PAGES страниц.
+    Результат — HTML в том же порядке, что и urls (None, если не загрузилась).
+    """
+    pages: asyncio.Queue = asyncio.Queue()
+    for _ in range(min(DETAIL_PAGES, len(urls))):
+        pages.put_nowait(await context.new_page())
+
+    async def fetch(url: str) -> Optional[str]:
+        page = await pages.get()
+        try:
+            logger.info(f"megasport: load product {url}")
+            await page.goto(url, wait_until="domcontentloaded")
+            try:
+                await page.wait_for_selector(PRODUCT_NAME_SELECTOR, timeout=RENDER_TIMEOUT_MS)
+            except PlaywrightTimeoutError:
+                pass  # разберём что есть: _parse_product_html сам отбросит карточку
+            return await page.content()
+        except Exception as e:
+            logger.warning(f"megasport: failed to load product {url}: {e}")
+            return None
+        finally:
+            pages.put_nowait(page)
+
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def _scrape_megasport_async(test_mode: bool) -> List[Product]:
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            context = await browser.new_context()
+            await context.route("**/*", _block_heavy_resources)
+
+            # 3. Собираем ссылки на товары
+            product_links = await _collect_product_links(context, test_mode)
+
+            if test_mode:
+                product_links = product_links[:10]
+                logger.info(f"megasport: test_mode, limit to {len(product_links)} products")
+
+            # 4. Грузим карточки параллельно
+            htmls = await _load_product_htmls(context, product_links)
+        finally:
+            await browser.close()
+
+    # 5. Парсим уже после загрузки
+    loaded = [(html, url) for url, html in zip(product_links, htmls) if html is not None]
+    return [prod for prod in _parse_product_htmls(loaded) if prod]
+
+
+def _parse_product_htmls(loaded: List[tuple[str, str]]) -> List[Optional[Product]]:
+    """
+    Разбирает пары (html, url) карточек. Разбор — чистый CPU, поэтому большие
+    партии отдаём пулу процессов (map сохраняет порядок).
+
+    Процессы запускаем через spawn: скрейпер работает в потоке cli, а fork
+    многопоточного процесса может унаследовать чужие захваченные блокировки.
+    """
+    if len(loaded) < PARALLEL_PARSE_MIN_PAGES:
+        return [_parse_product_html(html, url) for html, url in loaded]
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(mp_context=ctx) as ex:
+        return list(
+            ex.map(
+                _parse_product_html,
+                [html for html, _ in loaded],
+                [url for _, url in loaded],
+                chunksize=PARALLEL_PARSE_CHUNKSIZE,
+            )
+        )
+
+
+def scrape_megasport(test_mode: bool = False) -> List[Product]:
+    """
+    Скрейпер Megasport с эмуляцией браузера:
+
+    1. Открывает /category/skiing в Chromium через Playwright.
+    2. Жмёт кнопку "Load More" пока она есть (или 1 раз в test_mode).
+    3. Собирает все ссылки /products/...
+    4. Открывает карточки параллельно в нескольких вкладках и парсит товары.
+    5. Возвращает только те товары, где найдены "лыжные" длины.
+    """
+    logger.info(f"Start scraping megasport.ge (test_mode={test_mode})")
+
+    items = asyncio.run(_scrape_megasport_async(test_mode))
 
     logger.info(f"megasport: {len(items)} ski products scraped")
     return items
@@ -1,12 +1,23 @@
 # shop_snowmania_ge.py
+import logging
 import re
-from typing import Dict, List, Optional, Tuple, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Iterable, Iterator
 from urllib.parse import urljoin
 
+import lxml.html
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
+from lxml import etree
 
+from src.parsing_ski.http_cache import DEFAULT_CACHE_PATH, HttpCache
+from src.parsing_ski.http_session import make_session
 from src.parsing_ski.models import Product, MIN_SKI_LENGTH_CM, MAX_SKI_LENGTH_CM
+from src.parsing_ski.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
 
 BASE_DOMAIN = "https://snowmania.ge"
 
@@ -33,22 +44,61 @@ HEADERS = {
 
 SHOP_NAME = "snowmania.ge"
 
-PRICE_NUMBER_RE = re.compile(r'[\d.,]+')
+# Сколько карточек товаров качаем параллельно (на все категории вместе)
+DETAIL_WORKERS = 8
+
+# Сколько запросов в секунду шлём на сайт (все потоки вместе)
+REQUESTS_PER_SECOND = 10
 
-def get_soup(url: str) -> BeautifulSoup:
-    resp = requests.get(url, headers=HEADERS, timeout=30)
-    resp.raise_for_status()
-    return BeautifulSoup(resp.text, "html.parser")
+# Общая сессия: keep-alive, пул соединений, повторы на 429/502/503/504.
+# Все запросы идут через одно ведро токенов, на 429/503 оно замедляется
+_SESSION = make_session(HEADERS, rate_limit=TokenBucket(REQUESTS_PER_SECOND))
 
+# Кэш страниц категорий и карточек: условные запросы по ETag / Last-Modified.
+# Отдельный файл, чтобы не делить блокировку SQLite и LRU с xtreme
+_HTTP_CACHE = HttpCache(DEFAULT_CACHE_PATH.with_name("http_cache_snowmania.sqlite"))
+HTTP_CACHE_MAX_ENTRIES = 20_000
+# Версия сохранённого разбора страниц: поднимать при любом изменении разбора
+# категорий или карточек, иначе на неизменившихся страницах останется старый
+# результат (в том числе {} — "не лыжи")
+PAYLOAD_VERSION = 3
 
-def build_category_page_url(base_category_url: str, page: int) -> str:
+# Сколько разобранных карточек держим в памяти за один запуск: товар может
+# встретиться и в "новых", и в "б/у", и на нескольких страницах пагинации
+PRODUCT_CACHE_SIZE = 4096
+
+PRICE_NUMBER_RE = re.compile(r'[\d.,]+')
+# Числа блока цены; перед числом может стоять фраза WooCommerce,
+# тогда она попадает в свою группу (orig / curr)
+PRICE_TAGGED_RE = re.compile(
+    r"(?:(?P<orig>Original price was:)|(?P<curr>Current price is:))?\s*(?P<num>[\d.,]+)"
+)
+DIGITS_RE = re.compile(r"\d+")
+
+# Ссылки на товары из заголовков карточек на странице категории
+# (аналог CSS 'h2 a[href*="/product/"], h3 a[href*="/product/"]')
+_XP_HEADING_LINKS = etree.XPath(
+    "//h2//a[contains(@href, '/product/')] | //h3//a[contains(@href, '/product/')]"
+)
+_XP_TEXTS = etree.XPath(".//text()")
+# Подстрока в названии категории, по которой отличаем лыжи ("თხილამური")
+SKI_CATEGORY_MARKER = "თხილამური"
+# Без этой подстроки в HTML на странице точно нет ссылок на товары
+_PRODUCT_LINK_MARKER = "/product/"
+# Класс суммы в блоке цены WooCommerce
+PRICE_AMOUNT_CLASS = "woocommerce-Price-amount"
+
+
+def build_category_page_url(base: str, page: int) -> str:
     """
     WooCommerce обычно использует /page/N/.
     page = 1 -> базовый url без /page/1/
+
+    base — url категории уже без завершающего "/"
+    (его срезают один раз на категорию в iter_category_products).
     """
-    base = base_category_url.rstrip("/")
     if page <= 1:
-        return base + "/"
+        return f"{base}/"
     return f"{base}/page/{page}/"
 
 
@@ -57,7 +107,7 @@ def clean_price_value(p: str) -> str:
     Оставляем только число в виде '1700.00':
     - убираем валюту, пробелы, разделители тысяч.
     """
-    match = re.search(r"[\d.,]+", p)
+    match = PRICE_NUMBER_RE.search(p)
     if not match:
         return ""
     val = match.group(0)
@@ -95,111 +145,109 @@ def parse_price_block(text: str) -> tuple[float | None, float | None]:
         except ValueError:
             return None
 
-    # 1) Пытаемся вытащить по фразам "Original price was" / "Current price is"
-    orig_match = re.search(r"Original price was:\s*([\d.,]+)", text)
-    curr_match = re.search(r"Current price is:\s*([\d.,]+)", text)
-
-    if orig_match:
-        orig = _to_float(orig_match.group(1))
-    else:
-        orig = None
-
-    if curr_match:
-        curr = _to_float(curr_match.group(1))
-    else:
-        curr = None
-
-    # Если нашли обе — этого достаточно
-    if orig is not None and curr is not None:
-        return orig, curr
+    # Один проход по всем числам блока. Число сразу после фразы
+    # "Original price was:" / "Current price is:" помечено её группой;
+    # берём первое такое для каждой фразы, как re.search.
+    orig = curr = None
+    orig_seen = curr_seen = False
+    # для фоллбека: максимум и минимум по всем числам
+    hi = lo = None
+    for m in PRICE_TAGGED_RE.finditer(text):
+        v = _to_float(m.group("num"))
+
+        if m.group("orig") and not orig_seen:
+            orig_seen = True
+            orig = v
+        elif m.group("curr") and not curr_seen:
+            curr_seen = True
+            curr = v
 
-    # 2) Фоллбек: собираем все числа
-    raw_numbers = PRICE_NUMBER_RE.findall(text)
-    numbers: list[float] = []
-    for raw in raw_numbers:
-        v = _to_float(raw)
         if v is None:
             continue
-        if v not in numbers:
-            numbers.append(v)
-
-    if not numbers:
-        return None, None
-
-    # Если есть "Original price was", но нет Current,
-    # считаем: первая или максимальная — старая, последняя — текущая.
-    if "Original price was" in text and len(numbers) >= 2:
-        orig = max(numbers)
-        curr = min(numbers)
+        if hi is None:
+            hi = lo = v
+        elif v > hi:
+            hi = v
+        elif v < lo:
+            lo = v
+
+    # 1) Нашли обе цены по фразам — этого достаточно
+    if orig is not None and curr is not None:
         return orig, curr
 
-    # Обычный случай – одна цена
-    if len(numbers) == 1:
-        return numbers[0], numbers[0]
+    # 2) Фоллбек: по всем числам блока.
+    # Одна цена — она же и старая, и текущая; несколько чисел (с подсказкой
+    # "Original price was" или без) — максимум старая, минимум текущая.
+    return hi, lo
 
-    # Запасной вариант: несколько чисел без явных подсказок:
-    # максимум – оригинальная, минимум – текущая
-    orig = max(numbers)
-    curr = min(numbers)
-    return orig, curr
 
-
-def extract_products_from_category_page(
-    soup: BeautifulSoup,
-) -> List[Tuple[str, str]]:
+def extract_products_from_category_page(html: str) -> List[Tuple[str, str]]:
     """
     Возвращает список (url, title) для товаров с категории.
 
     На сайте snowmania.ge НЕТ стандартной разметки
     ul.products li.product, поэтому берём ссылки из заголовков h2/h3,
-    у которых href содержит '/product/'.
+    у которых href содержит '/product/'. Суп не строим — хватает lxml-дерева.
     """
     products: List[Tuple[str, str]] = []
     seen_urls = set()
 
-    for a in soup.select("h2 a, h3 a"):
-        href = a.get("href")
-        if not href:
-            continue
-        if "/product/" not in href:
-            continue
-
-        url = urljoin(BASE_DOMAIN, href)
+    for a in _XP_HEADING_LINKS(lxml.html.document_fromstring(html)):
+        url = urljoin(BASE_DOMAIN, a.get("href"))
         if url in seen_urls:
             continue
         seen_urls.add(url)
 
-        title = a.get_text(strip=True)
+        title = "".join(t.strip() for t in _XP_TEXTS(a))
         products.append((url, title))
 
     return products
 
 
-def get_product_categories(soup: BeautifulSoup) -> List[str]:
+def _text(el, separator: str = " ") -> str:
     """
-    Достаём список категорий из блока 'კატეგორია: ...'
-    (обычно .product_meta .posted_in a).
+    get_text(separator, strip=True), но для листового тега с одной строкой
+    внутри берём её напрямую через .string, без обхода потомков.
+    """
+    s = el.string
+    if type(s) is NavigableString:
+        return s.strip()
+    return el.get_text(separator, strip=True)
+
+
+def _iter_product_categories(soup: BeautifulSoup) -> Iterator[str]:
+    """
+    Категории из блока 'კატეგორია: ...' (обычно .product_meta .posted_in a)
+    по одной, чтобы проверка могла остановиться на первой подходящей.
     """
-    categories: List[str] = []
+    found = False
 
-    meta = soup.select_one(".product_meta")
+    meta = soup.find(class_="product_meta")
     if meta:
-        for a in meta.select(".posted_in a"):
-            txt = a.get_text(strip=True)
-            if txt:
-                categories.append(txt)
+        for posted_in in meta.find_all(class_="posted_in"):
+            for a in posted_in.find_all("a"):
+                txt = _text(a, "")
+                if txt:
+                    found = True
+                    yield txt
 
     # фоллбек: поиск по тексту "კატეგორია"
-    if not categories:
+    if not found:
         for span in soup.find_all("span"):
             if "კატეგორია" in span.get_text():
                 for a in span.find_all("a"):
-                    txt = a.get_text(strip=True)
+                    txt = _text(a, "")
                     if txt:
-                        categories.append(txt)
+                        yield txt
                 break
 
-    return categories
+
+def get_product_categories(soup: BeautifulSoup) -> List[str]:
+    """
+    Достаём список категорий из блока 'კატეგორია: ...'
+    (обычно .product_meta .posted_in a).
+    """
+    return list(_iter_product_categories(soup))
 
 
 def is_ski_product(soup: BeautifulSoup) -> bool:
@@ -207,8 +255,10 @@ def is_ski_product(soup: BeautifulSoup) -> bool:
     Оставляем только САМИ ЛЫЖИ.
     Условие: среди категорий есть подстрока 'თხილამური'.
     """
-    cats = [c.strip().lower() for c in get_product_categories(soup)]
-    return any("თხილამური" in c for c in cats)
+    return any(
+        SKI_CATEGORY_MARKER in c.strip().lower()
+        for c in _iter_product_categories(soup)
+    )
 
 def _price_to_float(value) -> Optional[float]:
     """
@@ -232,9 +282,20 @@ def _price_to_float(value) -> Optional[float]:
 def _extract_price_from_element(el) -> Optional[float]:
     if not el:
         return None
-    txt = el.get_text(" ", strip=True)
+    txt = _text(el)
     return _price_to_float(txt)
 
+def _find_price_amount(container, wrapper: str):
+    """
+    Первая .woocommerce-Price-amount внутри тега wrapper (del / ins)
+    в порядке документа — как select_one("del .woocommerce-Price-amount").
+    """
+    for el in container.find_all(wrapper):
+        amount = el.find(class_=PRICE_AMOUNT_CLASS)
+        if amount:
+            return amount
+    return None
+
 def extract_prices_from_dom(soup: BeautifulSoup) -> tuple[float | None, float | None]:
     """
     Пытается достать цены прямо из DOM WooCommerce:
@@ -245,14 +306,14 @@ def extract_prices_from_dom(soup: BeautifulSoup) -> tuple[float | None, float |
 
     Если скидки нет (нет <ins>), берёт единственную сумму.
     """
-    price_container = soup.select_one("p.price")
+    price_container = soup.find("p", class_="price")
     if not price_container:
         return None, None
 
     # старое значение (перечёркнутая цена)
-    del_amount = price_container.select_one("del .woocommerce-Price-amount, del span.woocommerce-Price-amount")
+    del_amount = _find_price_amount(price_container, "del")
     # новое значение (актуальная цена)
-    ins_amount = price_container.select_one("ins .woocommerce-Price-amount, ins span.woocommerce-Price-amount")
+    ins_amount = _find_price_amount(price_container, "ins")
 
     orig = _extract_price_from_element(del_amount) if del_amount else None
     curr = _extract_price_from_element(ins_amount) if ins_amount else None
@@ -263,7 +324,7 @@ def extract_prices_from_dom(soup: BeautifulSoup) -> tuple[float | None, float |
 
     # Нет скидки: ищем любую сумму в p.price
     if orig is None and curr is None:
-        amount = price_container.select_one(".woocommerce-Price-amount, span.woocommerce-Price-amount")
+        amount = price_container.find(class_=PRICE_AMOUNT_CLASS)
         v = _extract_price_from_element(amount) if amount else None
         return v, v
 
@@ -275,6 +336,22 @@ def extract_prices_from_dom(soup: BeautifulSoup) -> tuple[float | None, float |
 
     return orig, curr
 
+def _sizes_and_brand(attrs: List[Tuple[str, str]]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Размеры и бренд из строк таблицы характеристик (подпись, значение)
+    в порядке страницы: побеждает последняя подходящая строка, а подпись,
+    где есть и "ზომა", и "ბრენდი", даёт только размеры.
+    """
+    sizes = brand = None
+    for label, value in attrs:
+        if "ზომა" in label:
+            sizes = value
+        elif "ბრენდი" in label:
+            brand = value
+    return sizes, brand
+
+
+@lru_cache(maxsize=PRODUCT_CACHE_SIZE)
 def parse_product_page(url: str) -> Optional[Dict[str, Optional[str]]]:
     """
     Парсит:
@@ -283,65 +360,72 @@ def parse_product_page(url: str) -> Optional[Dict[str, Optional[str]]]:
       - размеры (строкой)
       - цены (original/current)
     Если товар не является лыжами — возвращаем None.
+
+    Результат кэшируется по url на время запуска; словарь общий, не менять.
+    Ошибка загрузки пробрасывается наружу: lru_cache исключения не запоминает,
+    так что после сбоя (например, таймаута) url запросится снова.
     """
-    try:
-        soup = get_soup(url)
-    except Exception as e:
-        print(f"[WARN] Failed to load product page {url}: {e}")
+    cached = _HTTP_CACHE.fetch(_SESSION, url, timeout=30, payload_version=PAYLOAD_VERSION)
+
+    # карточка не изменилась — берём прошлый разбор ({} означает "не лыжи")
+    if cached.unchanged and cached.payload is not None:
+        return cached.payload or None
+
+    # без слова "თხილამური" в HTML категории "лыжи" у товара точно нет — суп не строим
+    if SKI_CATEGORY_MARKER not in cached.text:
+        _HTTP_CACHE.store_payload(url, {}, PAYLOAD_VERSION)
         return None
 
+    soup = BeautifulSoup(cached.text, "lxml")
     if not is_ski_product(soup):
+        _HTTP_CACHE.store_payload(url, {}, PAYLOAD_VERSION)
         return None
 
     # заголовок — как модель
     title_el = (
-        soup.select_one("h1.product_title")
-        or soup.select_one(".product_title")
+        soup.find("h1", class_="product_title")
+        or soup.find(class_="product_title")
         or soup.find("h1")
     )
-    title = title_el.get_text(" ", strip=True) if title_el else None
+    title = _text(title_el) if title_el else None
 
-    # таблица характеристик: ищем бренд и размеры
-    brand = None
-    sizes = None
-
-    attrs_table = soup.select_one("table.woocommerce-product-attributes")
+    # таблица характеристик: пары (подпись, значение) в порядке строк,
+    # из неё берём бренд и размеры. Не dict: у повторной подписи он оставил бы
+    # позицию первой строки, и "последняя строка побеждает" бы сломалось
+    attrs: List[Tuple[str, str]] = []
+    attrs_table = soup.find("table", class_="woocommerce-product-attributes")
     if attrs_table:
-        for tr in attrs_table.select("tr"):
-            th = tr.select_one("th")
-            td = tr.select_one("td")
-            if not th or not td:
-                continue
-            label = th.get_text(" ", strip=True)
-            value = td.get_text(" ", strip=True)
-            if not value:
-                continue
-
-            label_lower = label.lower()
-            if "ზომა" in label_lower:
-                sizes = value
-            elif "ბრენდი" in label_lower:
-                brand = value
+        cells = ((tr.find("th"), tr.find("td")) for tr in attrs_table.find_all("tr"))
+        attrs = [
+            (_text(th).lower(), value)
+            for th, td in cells
+            if th and td and (value := _text(td))
+        ]
+
+    sizes, brand = _sizes_and_brand(attrs)
 
     # 1) пробуем достать цены из DOM
     original, current = extract_prices_from_dom(soup)
 
-    # 2) если не получилось — фоллбек через текстовый разбор
-    if original is None or current is None:
-        price_wrapper = soup.select_one("p.price, span.price, div.price")
+    # 2) если не получилось — фоллбек через текстовый разбор.
+    # extract_prices_from_dom отдаёт либо обе цены, либо ни одной
+    if original is None and current is None:
+        price_wrapper = soup.find(["p", "span", "div"], class_="price")
         price_text = price_wrapper.get_text(" ", strip=True) if price_wrapper else ""
         original, current = parse_price_block(price_text)
 
     # опционально на время отладки:
-    # print(f"[DBG] {url} -> original={original}, current={current}")
+    # logger.debug("[DBG] %s -> original=%s, current=%s", url, original, current)
 
-    return {
+    details = {
         "model": title or None,
         "brand": brand,
         "sizes": sizes,
         "original": original,
         "current": current,
     }
+    _HTTP_CACHE.store_payload(url, details, PAYLOAD_VERSION)
+    return details
 
 def split_sizes_to_list(sizes_raw: Optional[str]) -> List[Optional[str]]:
     """
@@ -352,7 +436,7 @@ def split_sizes_to_list(sizes_raw: Optional[str]) -> List[Optional[str]]:
     if not sizes_raw:
         return [None]
 
-    nums = re.findall(r"\d+", sizes_raw)
+    nums = DIGITS_RE.findall(sizes_raw)
     if not nums:
         return [sizes_raw.strip()] if sizes_raw.strip() else [None]
     return nums
@@ -369,7 +453,7 @@ def size_str_to_length_cm(size: Optional[str]) -> Optional[int]:
     if not size:
         return None
 
-    m = re.search(r"\d+", str(size))
+    m = DIGITS_RE.search(str(size))
     if not m:
         return None
 
@@ -389,12 +473,40 @@ def is_size_in_ski_range(size: Optional[str]) -> bool:
         return False
     return MIN_SKI_LENGTH_CM <= length <= MAX_SKI_LENGTH_CM
 
+def _category_page_products(url: str) -> List[Tuple[str, str]]:
+    """
+    Товары со страницы категории через HTTP-кэш: если страница не изменилась,
+    берём ранее разобранный список и HTML не разбираем.
+    """
+    cached = _HTTP_CACHE.fetch(_SESSION, url, timeout=30, payload_version=PAYLOAD_VERSION)
+    if cached.unchanged and cached.payload is not None:
+        return [tuple(item) for item in cached.payload]
+
+    # ни одной ссылки на товар в сыром HTML — пустая страница, дерево не строим
+    if _PRODUCT_LINK_MARKER not in cached.text:
+        return []
+
+    products = extract_products_from_category_page(cached.text)
+    _HTTP_CACHE.store_payload(url, products, PAYLOAD_VERSION)
+    return products
+
+
+def _parse_product_page_safe(url: str) -> Optional[Dict[str, Optional[str]]]:
+    """parse_product_page для пула потоков: ошибка загрузки или разбора не роняет всю страницу."""
+    try:
+        return parse_product_page(url)
+    except Exception as e:
+        logger.warning("[WARN] Failed to load or parse product page %s: %s", url, e)
+        return None
+
+
 def iter_category_products(
     base_category_url: str,
     condition: str,
     *,
     test_mode: bool = False,
     test_max_pages: int = 1,
+    detail_pool: Optional[ThreadPoolExecutor] = None,
 ) -> Iterable[Dict[str, Optional[str]]]:
     """
     Итерируем по всем страницам категории:
@@ -402,67 +514,120 @@ def iter_category_products(
       - идём на карточки товаров
       - берём ТОЛЬКО лыжи подходящей длины (по MIN_SKI_LENGTH_CM..MAX_SKI_LENGTH_CM),
         и на выход отдаём по одной строке на каждый подходящий размер.
+
+    Карточки качаются в detail_pool (общий для категорий, которые обходятся
+    одновременно); без него — в собственном пуле на DETAIL_WORKERS потоков.
     """
+    base = base_category_url.rstrip("/")
     page = 1
-    while True:
-        if test_mode and page > test_max_pages:
-            break
+    pool = (
+        nullcontext(detail_pool)
+        if detail_pool is not None
+        else ThreadPoolExecutor(max_workers=DETAIL_WORKERS)
+    )
+    with pool as ex:
+        while True:
+            if test_mode and page > test_max_pages:
+                break
 
-        url = build_category_page_url(base_category_url, page)
-        print(f"[INFO] Category={condition} page={page} url={url}")
+            url = build_category_page_url(base, page)
+            logger.info("[INFO] Category=%s page=%d url=%s", condition, page, url)
 
-        # не падаем на 404, а прекращаем категорию
-        try:
-            soup = get_soup(url)
-        except requests.exceptions.HTTPError as e:
-            status = e.response.status_code if e.response is not None else None
-            print(
-                f"[INFO] Stop category '{condition}' on page={page}: "
-                f"HTTP {status} for url={url}"
-            )
-            break
-        except Exception as e:
-            print(
-                f"[WARN] Failed to load category '{condition}' page={page} url={url}: {e}"
-            )
-            break
+            # не падаем на 404, а прекращаем категорию
+            try:
+                products = _category_page_products(url)
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                logger.info(
+                    "[INFO] Stop category '%s' on page=%d: HTTP %s for url=%s",
+                    condition, page, status, url,
+                )
+                break
+            except Exception as e:
+                logger.warning(
+                    "[WARN] Failed to load category '%s' page=%d url=%s: %s",
+                    condition, page, url, e,
+                )
+                break
 
-        products = extract_products_from_category_page(soup)
-        print(f"[INFO] Found {len(products)} products on page {page}")
+            logger.info("[INFO] Found %d products on page %d", len(products), page)
 
-        if not products:
-            break
+            if not products:
+                break
 
-        for product_url, _title in products:
-            try:
-                details = parse_product_page(product_url)
+            # карточки страницы качаем параллельно, map сохраняет порядок
+            product_urls = [product_url for product_url, _title in products]
+            for product_url, details in zip(
+                product_urls, ex.map(_parse_product_page_safe, product_urls)
+            ):
                 # Если не удалось распарсить или это не лыжи — пропускаем
                 if details is None:
                     continue
-            except Exception as e:
-                print(f"[WARN] Failed to parse product page {product_url}: {e}")
-                continue
 
-            # sizes_raw — строка "170, 177, 184"
-            sizes_list = split_sizes_to_list(details["sizes"])
+                # sizes_raw — строка "170, 177, 184"
+                sizes_list = split_sizes_to_list(details["sizes"])
 
-            # Перебираем размеры и оставляем только подходящие по длине
-            for size in sizes_list:
-                if not is_size_in_ski_range(size):
-                    continue
+                # Перебираем размеры и оставляем только подходящие по длине
+                for size in sizes_list:
+                    if not is_size_in_ski_range(size):
+                        continue
 
-                yield {
-                    "shop": SHOP_NAME,
-                    "condition": condition,  # "new" / "used"
-                    "brand": details["brand"],
-                    "model": details["model"],
-                    "size": size,
-                    "original": details["original"],
-                    "current": details["current"],
-                    "url": product_url,
-                }
+                    yield {
+                        "shop": SHOP_NAME,
+                        "condition": condition,  # "new" / "used"
+                        "brand": details["brand"],
+                        "model": details["model"],
+                        "size": size,
+                        "original": details["original"],
+                        "current": details["current"],
+                        "url": product_url,
+                    }
 
-        page += 1
+            page += 1
+
+
+def _scrape_category(
+    base_url: str,
+    condition: str,
+    test_mode: bool,
+    test_max_pages: int,
+    detail_pool: Optional[ThreadPoolExecutor] = None,
+) -> List[Product]:
+    """Все подходящие лыжи одной категории в виде списка Product."""
+    logger.info("[INFO] Category '%s'", condition)
+    products: List[Product] = []
+
+    for row in iter_category_products(
+        base_url,
+        condition,
+        test_mode=test_mode,
+        test_max_pages=test_max_pages,
+        detail_pool=detail_pool,
+    ):
+        current_price = _price_to_float(row["current"])
+        old_price = _price_to_float(row["original"])
+
+        size = row["size"]
+        sizes_list = [size] if size else []
+
+        p = Product(
+            shop=SHOP_NAME,
+            url=row["url"],
+            brand=row["brand"],
+            model=row["model"],
+            title=row["model"],
+            sizes=sizes_list,
+            current_price=current_price,
+            old_price=old_price,
+            currency="GEL",
+            in_stock=True,
+            quantity=None,
+            shop_sku=None,
+            condition=condition,  # "new" / "used"
+        )
+        products.append(p)
+
+    return products
 
 
 def scrape_snowmania(
@@ -472,46 +637,38 @@ def scrape_snowmania(
     """
     Основная функция: обходит snowmania.ge (новые + б/у лыжи)
     и возвращает список Product.
+
+    Категории независимы, поэтому обходим их параллельно; карточки всех
+    категорий качает один пул на DETAIL_WORKERS потоков, а общий лимит
+    запросов к сайту держит ведро токенов сессии. Порядок товаров — как
+    в CATEGORY_URLS.
     """
-    print(f"[INFO] Start scraping {SHOP_NAME}")
+    logger.info("[INFO] Start scraping %s", SHOP_NAME)
     products: List[Product] = []
 
-    for base_url, condition in CATEGORY_URLS:
-        print(f"[INFO] Category '{condition}'")
-        for row in iter_category_products(
-            base_url,
-            condition,
-            test_mode=test_mode,
-            test_max_pages=test_max_pages,
-        ):
-            current_price = _price_to_float(row["current"])
-            old_price = _price_to_float(row["original"])
-
-            size = row["size"]
-            sizes_list = [size] if size else []
-
-            p = Product(
-                shop=SHOP_NAME,
-                url=row["url"],
-                brand=row["brand"],
-                model=row["model"],
-                title=row["model"],
-                sizes=sizes_list,
-                current_price=current_price,
-                old_price=old_price,
-                currency="GEL",
-                in_stock=True,
-                quantity=None,
-                shop_sku=None,
-                condition=condition,  # "new" / "used"
+    # карточки разбираем заново в каждом запуске, внутри запуска — по разу на url
+    parse_product_page.cache_clear()
+
+    with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as detail_pool, \
+            ThreadPoolExecutor(max_workers=len(CATEGORY_URLS)) as ex:
+        futures = [
+            ex.submit(
+                _scrape_category,
+                base_url, condition, test_mode, test_max_pages, detail_pool,
             )
-            products.append(p)
+            for base_url, condition in CATEGORY_URLS
+        ]
+        for future in futures:
+            products.extend(future.result())
+
+    _HTTP_CACHE.prune(HTTP_CACHE_MAX_ENTRIES)
 
-    print(f"[OK] Finished {SHOP_NAME}, total rows: {len(products)}")
+    logger.info("[OK] Finished %s, total rows: %d", SHOP_NAME, len(products))
     return products
 
 
 if __name__ == "__main__":
     # standalone debug
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     res = scrape_snowmania(test_mode=True, test_max_pages=1)
     print(f"Scraped {len(res)} rows from {SHOP_NAME}")
@@ -10,18 +10,24 @@ backfill_orig_price.py – дозаполняет orig_price в таблице s
 
 Логика:
     - читаем все skis_unified*.csv
-    - для строк с НЕпустым orig_price ищем соответствующие записи в skis
-      (по shop_code, url, length_cm, condition)
-    - если в БД orig_price IS NULL — записываем значение
+    - для строк с НЕпустым orig_price берём первое значение по ключу
+      (shop_code, url, length_cm, condition) и кладём во временную таблицу
+    - одним UPDATE записываем его в skis, где orig_price IS NULL
 """
 
+import argparse
 import csv
 import sqlite3
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import Optional, Dict, Tuple, Any
+from typing import Optional, Dict, Tuple, Any, List
 import logging
 
+try:
+    from update_db.db_common import connect
+except ImportError:  # запуск файлом: python src/update_db/backfill_orig_price.py
+    from db_common import connect
+
 
 # ──────────────────────────────────────────────────────────────
 # PATHS
@@ -31,7 +37,6 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_DB_PATH = ROOT_DIR / "data" / "db" / "skis.db"
 DEFAULT_CSV_DIR = ROOT_DIR / "data" / "exports"
 LOG_DIR = ROOT_DIR / "logs"
-LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FILE = LOG_DIR / f"db_backfill_{datetime.now().strftime('%Y-%m-%d')}.log"
 
@@ -40,18 +45,25 @@ LOG_FILE = LOG_DIR / f"db_backfill_{datetime.now().strftime('%Y-%m-%d')}.log"
 # LOGGING
 # ──────────────────────────────────────────────────────────────
 
-logging.basicConfig(
-    filename=str(LOG_FILE),
-    level=logging.INFO,
-    encoding="utf-8",
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+def setup_logging() -> None:
+    """
+    Лог в LOG_FILE + консоль. Вызывается только при запуске файла как скрипта:
+    при импорте (например, из manage_data.py) логирование настраивает вызывающий.
+    """
+    LOG_DIR.mkdir(exist_ok=True)
+
+    logging.basicConfig(
+        filename=str(LOG_FILE),
+        level=logging.INFO,
+        encoding="utf-8",
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
 
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter("%(message)s"))
-logging.getLogger().addHandler(console)
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger().addHandler(console)
 
 
 # ──────────────────────────────────────────────────────────────
@@ -62,53 +74,110 @@ def now_iso() -> str:
     return datetime.now(UTC).replace(microsecond=0).isoformat()
 
 
-def parse_float(value: str) -> Optional[float]:
-    if value is None:
-        return None
-    v = str(value).strip()
-    if not v:
+# Десятичная запятая -> точка; translate за один проход в C
+_DECIMAL_COMMA = str.maketrans(",", ".")
+
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    """Число из ячейки CSV ('1700', '180,5'); пусто / мусор -> None."""
+    if not value:
         return None
-    v = v.replace(",", ".")
     try:
-        return float(v)
+        return float(value.translate(_DECIMAL_COMMA).strip())
     except ValueError:
         return None
 
 
+def _cell(row: List[str], i: Optional[int]) -> Optional[str]:
+    """Значение колонки i строки csv.reader; нет колонки или короткая строка — None."""
+    return row[i] if i is not None and i < len(row) else None
+
+
 # ──────────────────────────────────────────────────────────────
 # MAIN LOGIC
 # ──────────────────────────────────────────────────────────────
 
-def load_ski_index(conn: sqlite3.Connection) -> Dict[Tuple[str, str, Optional[float], str], Tuple[int, Optional[float]]]:
+# Первые orig_price из CSV по ключу лыжи. Значения в skis import_csvs
+# уже сохраняет обрезанными, поэтому сравниваем колонки как есть —
+# так SQLite ищет по индексу временной таблицы.
+_CREATE_CSV_ORIG_SQL = """
+    CREATE TEMP TABLE csv_orig (
+        shop_code  TEXT NOT NULL,
+        url        TEXT NOT NULL,
+        length_cm  REAL,
+        condition  TEXT NOT NULL,
+        orig_price REAL NOT NULL
+    )
+"""
+_INDEX_CSV_ORIG_SQL = """
+    CREATE INDEX temp.idx_csv_orig_key
+        ON csv_orig (url, shop_code, condition, length_cm)
+"""
+_BACKFILL_SQL = """
+    UPDATE skis
+    SET orig_price = (
+        SELECT c.orig_price
+        FROM csv_orig c
+        JOIN shops sh ON sh.code = c.shop_code
+        WHERE c.url = skis.url
+          AND c.condition = skis.condition
+          AND c.length_cm IS skis.length_cm
+          AND sh.id = skis.shop_id
+    )
+    WHERE orig_price IS NULL
+      AND EXISTS (
+        SELECT 1
+        FROM csv_orig c
+        JOIN shops sh ON sh.code = c.shop_code
+        WHERE c.url = skis.url
+          AND c.condition = skis.condition
+          AND c.length_cm IS skis.length_cm
+          AND sh.id = skis.shop_id
+      )
+"""
+
+
+def collect_csv_orig_prices(
+    files: List[Path],
+) -> Dict[Tuple[str, str, Optional[float], str], float]:
     """
-    Загружает все лыжи из БД и строит индекс:
+    Собирает orig_price из CSV:
         key = (shop_code, url, length_cm, condition)
-        value = (ski_id, orig_price)
-    """
-    sql = """
-        SELECT s.id,
-               s.orig_price,
-               s.length_cm,
-               s.condition,
-               s.url,
-               sh.code
-        FROM skis s
-        JOIN shops sh ON sh.id = s.shop_id
+        value = первый непустой orig_price для этого ключа
     """
-    cur = conn.execute(sql)
-
-    index: Dict[Tuple[str, str, Optional[float], str], Tuple[int, Optional[float]]] = {}
-    for ski_id, orig_price, length_cm, condition, url, shop_code in cur.fetchall():
-        key = (
-            (shop_code or "").strip(),
-            (url or "").strip(),
-            float(length_cm) if length_cm is not None else None,
-            (condition or "new").strip(),
-        )
-        index[key] = (ski_id, orig_price)
+    orig_prices: Dict[Tuple[str, str, Optional[float], str], float] = {}
+
+    for file_path in files:
+        logging.info(f"Scanning {file_path.name} ...")
+        with file_path.open("r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                continue
+
+            # индексы нужных колонок (при повторе имени — последняя, как в DictReader)
+            positions = {name: i for i, name in enumerate(header)}
+            i_shop, i_url, i_condition, i_length, i_orig = (
+                positions.get(name)
+                for name in ("shop", "url", "condition", "length_cm", "orig_price")
+            )
+
+            for row in reader:
+                if not row:
+                    continue
+
+                shop_code = (_cell(row, i_shop) or "").strip()
+                url = (_cell(row, i_url) or "").strip()
+                condition = (_cell(row, i_condition) or "new").strip()
+                length_cm = parse_float(_cell(row, i_length))
+                orig_price = parse_float(_cell(row, i_orig))
+
+                if not shop_code or not url or orig_price is None:
+                    continue
 
-    logging.info(f"Loaded {len(index)} skis from DB into index")
-    return index
+                orig_prices.setdefault((shop_code, url, length_cm, condition), orig_price)
+
+    return orig_prices
 
 
 def backfill_from_csvs(
@@ -118,6 +187,9 @@ def backfill_from_csvs(
     """
     Проходит по всем skis_unified*.csv, собирает orig_price
     и обновляет только те skis, где orig_price IS NULL.
+
+    Сопоставление CSV с БД делает SQLite: значения из CSV кладём
+    во временную таблицу и обновляем skis одним UPDATE.
     """
     files = sorted(f for f in csv_dir.glob("skis_unified*.csv") if f.is_file())
     if not files:
@@ -126,66 +198,59 @@ def backfill_from_csvs(
 
     logging.info(f"Found {len(files)} CSV files for backfill")
 
-    ski_index = load_ski_index(conn)
-
-    updates: Dict[int, float] = {}  # ski_id -> orig_price_to_set
-
-    for file_path in files:
-        logging.info(f"Scanning {file_path.name} ...")
-        with file_path.open("r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                shop_code = (row.get("shop") or "").strip()
-                url = (row.get("url") or "").strip()
-                condition = (row.get("condition") or "new").strip()
-                length_cm = parse_float(row.get("length_cm"))
-                orig_price = parse_float(row.get("orig_price"))
-
-                if not shop_code or not url or orig_price is None:
-                    continue
-
-                key = (shop_code, url, length_cm, condition)
-                if key not in ski_index:
-                    # Лыжи в БД нет – значит, либо старый CSV, либо что-то нестандартное.
-                    continue
-
-                ski_id, db_orig_price = ski_index[key]
-                if db_orig_price is None and ski_id not in updates:
-                    # Кандидат на обновление
-                    updates[ski_id] = orig_price
-
-    if not updates:
-        logging.info("No orig_price values to backfill – everything already filled.")
+    orig_prices = collect_csv_orig_prices(files)
+    if not orig_prices:
+        logging.info("No orig_price values in CSV files – nothing to backfill.")
         return
 
-    logging.info(f"Will backfill orig_price for {len(updates)} skis")
+    logging.info(f"Collected orig_price for {len(orig_prices)} CSV keys")
 
     conn.execute("BEGIN;")
     try:
-        for ski_id, orig_price in updates.items():
-            conn.execute(
-                "UPDATE skis SET orig_price = ? WHERE id = ? AND orig_price IS NULL",
-                (orig_price, ski_id),
-            )
+        conn.execute(_CREATE_CSV_ORIG_SQL)
+        conn.executemany(
+            "INSERT INTO csv_orig (shop_code, url, length_cm, condition, orig_price) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key + (orig_price,) for key, orig_price in orig_prices.items()),
+        )
+        conn.execute(_INDEX_CSV_ORIG_SQL)
+
+        updated = conn.execute(_BACKFILL_SQL).rowcount
+        conn.execute("DROP TABLE temp.csv_orig")
         conn.commit()
-        logging.info("Backfill committed successfully")
     except Exception as e:
         conn.rollback()
         logging.error(f"ERROR during backfill: {e}")
         raise
 
+    if updated:
+        logging.info(f"Backfilled orig_price for {updated} skis")
+    else:
+        logging.info("No orig_price values to backfill – everything already filled.")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Backfill skis.orig_price from skis_unified*.csv"
+    )
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH))
+    parser.add_argument("--csv-dir", default=str(DEFAULT_CSV_DIR))
+    return parser.parse_args(argv)
+
+
+def main(args: Optional[argparse.Namespace] = None):
+    if args is None:
+        args = parse_args()
 
-def main():
-    db_path = DEFAULT_DB_PATH
-    csv_dir = DEFAULT_CSV_DIR
+    db_path = Path(args.db)
+    csv_dir = Path(args.csv_dir)
 
     logging.info("────────────────────────────────────────────")
     logging.info("START BACKFILL ORIG_PRICE")
     logging.info(f"DB:  {db_path}")
     logging.info(f"CSV: {csv_dir}")
 
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn = connect(db_path)
 
     try:
         backfill_from_csvs(conn, csv_dir)
@@ -195,4 +260,5 @@ def main():
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
@@ -21,18 +21,35 @@ import argparse
 import sqlite3
 from textwrap import dedent
 from pathlib import Path
+from typing import List, Optional
 
 
 # Определяем корень проекта: .../parsing_ski
 ROOT_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_DB_PATH = ROOT_DIR / "data" / "db" / "skis.db"
 
+# Настройки самого файла БД. page_size действует только на новом (пустом)
+# файле, поэтому задаём его до первой таблицы и до перехода в WAL;
+# journal_mode=WAL сохраняется в файле и для всех следующих соединений
+DB_FILE_PRAGMAS = (
+    "PRAGMA page_size = 8192;",
+    "PRAGMA journal_mode = WAL;",
+)
+
+# Цены одного run'а по ski_id прямо из индекса (для detect_db_changes).
+# Вынесен в константу: import_csvs досоздаёт его в БД, собранных старой схемой
+IDX_PH_RUN_SKI_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_ph_run_ski ON price_history (run_id, ski_id, price);"
+)
+
 
 def create_schema(conn: sqlite3.Connection) -> None:
     conn.execute("PRAGMA foreign_keys = ON;")
+    for pragma in DB_FILE_PRAGMAS:
+        conn.execute(pragma)
 
     schema_sql = dedent(
-        """
+        f"""
         -- Магазины
         CREATE TABLE IF NOT EXISTS shops (
             id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -127,6 +144,8 @@ def create_schema(conn: sqlite3.Connection) -> None:
         CREATE INDEX IF NOT EXISTS idx_price_history_run
             ON price_history (run_id);
 
+        {IDX_PH_RUN_SKI_SQL}
+
         CREATE INDEX IF NOT EXISTS idx_scrape_runs_run_at
             ON scrape_runs (run_at);
 
@@ -232,19 +251,24 @@ def create_schema(conn: sqlite3.Connection) -> None:
         """
     )
 
-    conn.executescript(schema_sql)
-    conn.commit()
+    # вся схема — одной транзакцией, а не отдельным коммитом на каждый CREATE
+    conn.executescript(f"BEGIN IMMEDIATE;\n{schema_sql}\nCOMMIT;")
 
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Create SQLite DB for skis project")
     parser.add_argument(
         "--db",
         default=str(DEFAULT_DB_PATH),
         help="Path to SQLite DB file (default: data/db/skis.db)",
     )
-    args = parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def main(args: Optional[argparse.Namespace] = None) -> None:
+    if args is None:
+        args = parse_args()
 
     db_path = Path(args.db)
     db_path.parent.mkdir(parents=True, exist_ok=True)
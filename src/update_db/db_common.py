@@ -0,0 +1,31 @@
+"""
+db_common.py – общее подключение к SQLite для скриптов update_db.
+
+Импортируется и из пакета (manage_data.py: update_db.db_common), и при запуске
+скрипта файлом (python src/update_db/import_csvs.py: db_common).
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Any, Union
+
+# WAL + synchronous=NORMAL: на commit один fsync журнала вместо двух,
+# плюс временные таблицы в памяти и кэш страниц ~20 МБ
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-20000;",
+)
+
+
+def connect(db_path: Union[str, Path], **kwargs: Any) -> sqlite3.Connection:
+    """
+    sqlite3.connect (kwargs передаются как есть) с включёнными foreign keys
+    и SQLITE_PRAGMAS.
+    """
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute("PRAGMA foreign_keys = ON;")
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
@@ -21,7 +21,12 @@ import logging
 import sqlite3
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import List, Optional, Tuple
+
+try:
+    from update_db.db_common import connect
+except ImportError:  # запуск файлом: python src/update_db/detect_db_changes.py
+    from db_common import connect
 
 # ──────────────────────────────────────────────
 # ПУТИ
@@ -30,7 +35,6 @@ from typing import Dict, Tuple
 ROOT_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_DB_PATH = ROOT_DIR / "data" / "db" / "skis.db"
 LOG_DIR = ROOT_DIR / "logs"
-LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FILE = LOG_DIR / f"db_changes_{datetime.now().strftime('%Y-%m-%d')}.log"
 
@@ -38,18 +42,25 @@ LOG_FILE = LOG_DIR / f"db_changes_{datetime.now().strftime('%Y-%m-%d')}.log"
 # ЛОГИРОВАНИЕ
 # ──────────────────────────────────────────────
 
-logging.basicConfig(
-    filename=str(LOG_FILE),
-    level=logging.INFO,
-    encoding="utf-8",
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+def setup_logging() -> None:
+    """
+    Лог в LOG_FILE + консоль. Вызывается только при запуске файла как скрипта:
+    при импорте (например, из manage_data.py) логирование настраивает вызывающий.
+    """
+    LOG_DIR.mkdir(exist_ok=True)
+
+    logging.basicConfig(
+        filename=str(LOG_FILE),
+        level=logging.INFO,
+        encoding="utf-8",
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
 
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter("%(message)s"))
-logging.getLogger().addHandler(console)
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger().addHandler(console)
 
 
 def now_iso() -> str:
@@ -98,15 +109,18 @@ def ensure_changes_tables(conn: sqlite3.Connection) -> None:
 # ──────────────────────────────────────────────
 
 def get_last_two_runs(conn: sqlite3.Connection) -> Tuple[int, int]:
+    # только два последних run'а, по индексу idx_scrape_runs_run_at;
+    # run'ы одного импорта могут совпасть по run_at — тогда новее тот, у кого больше id
     cur = conn.execute(
-        "SELECT id, run_at, source_file FROM scrape_runs ORDER BY run_at"
+        "SELECT id, run_at, source_file FROM scrape_runs "
+        "ORDER BY run_at DESC, id DESC LIMIT 2"
     )
     rows = cur.fetchall()
     if len(rows) < 2:
         raise RuntimeError("В scrape_runs меньше двух записей, сравнивать нечего")
 
-    old_id, old_at, old_file = rows[-2]
-    new_id, new_at, new_file = rows[-1]
+    new_id, new_at, new_file = rows[0]
+    old_id, old_at, old_file = rows[1]
 
     logging.info(
         f"Using runs: OLD(id={old_id}, at={old_at}, file={old_file}) "
@@ -115,28 +129,48 @@ def get_last_two_runs(conn: sqlite3.Connection) -> Tuple[int, int]:
     return old_id, new_id
 
 
-def load_prices_for_run(conn: sqlite3.Connection, run_id: int) -> Dict[int, float]:
-    """
-    Возвращает словарь: ski_id -> price для заданного run_id.
-    """
-    cur = conn.execute(
-        "SELECT ski_id, price FROM price_history WHERE run_id = ?", (run_id,)
-    )
-    data: Dict[int, float] = {}
-    for ski_id, price in cur.fetchall():
-        data[int(ski_id)] = float(price)
-    return data
+# Изменения между run'ами пишем прямо из price_history, без выгрузки в Python.
+# Параметры: :old / :new — id run'ов, :now — created_at
+_INSERT_NEW_ARRIVALS_SQL = """
+    INSERT INTO changes_new_arrival (run_id, ski_id, created_at)
+    SELECT :new, n.ski_id, :now
+    FROM price_history n
+    WHERE n.run_id = :new
+      AND NOT EXISTS (
+        SELECT 1 FROM price_history o
+        WHERE o.run_id = :old AND o.ski_id = n.ski_id
+      )
+"""
+_INSERT_SOLD_OUT_SQL = """
+    INSERT INTO changes_sold_out (run_id, ski_id, created_at)
+    SELECT :new, o.ski_id, :now
+    FROM price_history o
+    WHERE o.run_id = :old
+      AND NOT EXISTS (
+        SELECT 1 FROM price_history n
+        WHERE n.run_id = :new AND n.ski_id = o.ski_id
+      )
+"""
+_INSERT_PRICE_CHANGES_SQL = """
+    INSERT INTO changes_price_change
+        (run_id, ski_id, old_price, new_price, created_at)
+    SELECT :new, n.ski_id, o.price, n.price, :now
+    FROM price_history n
+    JOIN price_history o ON o.run_id = :old AND o.ski_id = n.ski_id
+    WHERE n.run_id = :new
+      AND o.price <> n.price
+"""
 
 
 def clear_existing_changes_for_run(conn: sqlite3.Connection, run_id: int) -> None:
     """
     На всякий случай очищаем изменения для данного run_id,
     чтобы можно было безопасно перезапускать скрипт.
+    Не коммитит: выполняется в транзакции detect_changes.
     """
     conn.execute("DELETE FROM changes_new_arrival WHERE run_id = ?", (run_id,))
     conn.execute("DELETE FROM changes_sold_out WHERE run_id = ?", (run_id,))
     conn.execute("DELETE FROM changes_price_change WHERE run_id = ?", (run_id,))
-    conn.commit()
 
 
 # ──────────────────────────────────────────────
@@ -155,68 +189,26 @@ def detect_changes(
 
     logging.info(f"Detecting changes: old_run_id={old_run_id}, new_run_id={new_run_id}")
 
-    old_prices = load_prices_for_run(conn, old_run_id)
-    new_prices = load_prices_for_run(conn, new_run_id)
-
-    old_set = set(old_prices.keys())
-    new_set = set(new_prices.keys())
+    # Очистка и запись — одна транзакция: один commit, и при ошибке
+    # старые изменения run'а не теряются
+    conn.execute("BEGIN;")
+    try:
+        # Очистим прошлые записи для new_run_id, если они были.
+        # После этого дублей быть не может: ski_id в run'е уникален
+        # (UNIQUE(ski_id, run_id) в price_history), поэтому ниже обычный INSERT
+        clear_existing_changes_for_run(conn, new_run_id)
 
-    # Новые: были только в новом
-    new_arrivals = new_set - old_set
-    # Проданные: были только в старом
-    sold_out = old_set - new_set
-    # Цена изменилась: есть в обоих, но цены различаются
-    common = old_set & new_set
-    price_changes = {
-        ski_id
-        for ski_id in common
-        if old_prices[ski_id] != new_prices[ski_id]
-    }
+        params = {"old": old_run_id, "new": new_run_id, "now": now_iso()}
 
-    logging.info(
-        f"Changes: new_arrivals={len(new_arrivals)}, "
-        f"sold_out={len(sold_out)}, price_changes={len(price_changes)}"
-    )
+        # Новые / проданные / с изменившейся ценой — каждое одним INSERT ... SELECT
+        new_arrivals = conn.execute(_INSERT_NEW_ARRIVALS_SQL, params).rowcount
+        sold_out = conn.execute(_INSERT_SOLD_OUT_SQL, params).rowcount
+        price_changes = conn.execute(_INSERT_PRICE_CHANGES_SQL, params).rowcount
 
-    # Очистим прошлые записи для new_run_id, если они были
-    clear_existing_changes_for_run(conn, new_run_id)
-
-    conn.execute("BEGIN;")
-    try:
-        now = now_iso()
-
-        # Новые
-        for ski_id in new_arrivals:
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO changes_new_arrival (run_id, ski_id, created_at)
-                VALUES (?, ?, ?)
-                """,
-                (new_run_id, ski_id, now),
-            )
-
-        # Проданные
-        for ski_id in sold_out:
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO changes_sold_out (run_id, ski_id, created_at)
-                VALUES (?, ?, ?)
-                """,
-                (new_run_id, ski_id, now),
-            )
-
-        # Изменение цены
-        for ski_id in price_changes:
-            old_price = old_prices[ski_id]
-            new_price = new_prices[ski_id]
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO changes_price_change
-                    (run_id, ski_id, old_price, new_price, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (new_run_id, ski_id, old_price, new_price, now),
-            )
+        logging.info(
+            f"Changes: new_arrivals={new_arrivals}, "
+            f"sold_out={sold_out}, price_changes={price_changes}"
+        )
 
         conn.commit()
         logging.info("Changes saved to DB successfully.")
@@ -227,14 +219,19 @@ def detect_changes(
         raise
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Detect changes between two scrape_runs and store them in DB tables"
     )
     parser.add_argument("--db", default=str(DEFAULT_DB_PATH))
     parser.add_argument("--old-run-id", type=int, help="ID старого run (опционально)")
     parser.add_argument("--new-run-id", type=int, help="ID нового run (опционально)")
-    args = parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def main(args: Optional[argparse.Namespace] = None):
+    if args is None:
+        args = parse_args()
 
     db_path = Path(args.db)
 
@@ -242,8 +239,9 @@ def main():
     logging.info("START DB CHANGES DETECTION")
     logging.info(f"DB: {db_path}")
 
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    # isolation_level=None: модуль sqlite3 сам транзакций не открывает,
+    # их границы задают явные BEGIN / commit в detect_changes
+    conn = connect(db_path, isolation_level=None)
 
     try:
         if args.old_run_id is not None and args.new_run_id is not None:
@@ -269,4 +267,5 @@ def main():
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
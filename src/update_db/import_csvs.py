@@ -13,9 +13,16 @@ import csv
 import sqlite3
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 
+try:
+    from update_db.create_db import IDX_PH_RUN_SKI_SQL
+    from update_db.db_common import connect
+except ImportError:  # запуск файлом: python src/update_db/import_csvs.py
+    from create_db import IDX_PH_RUN_SKI_SQL
+    from db_common import connect
+
 
 # ──────────────────────────────────────────────────────────────
 # PATHS
@@ -25,27 +32,59 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_DB_PATH = ROOT_DIR / "data" / "db" / "skis.db"
 DEFAULT_CSV_DIR = ROOT_DIR / "data" / "exports"
 LOG_DIR = ROOT_DIR / "logs"
-LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FILE = LOG_DIR / f"db_update_{datetime.now().strftime('%Y-%m-%d')}.log"
 
+# Сколько строк price_history копим перед одним executemany
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Индексы, которых нет в БД, созданной старой версией create_db: run_db_all
+# create_db не запускает, поэтому досоздаём их при импорте (DDL — из create_db)
+IMPORT_INDEXES_SQL = f"""
+    {IDX_PH_RUN_SKI_SQL}
+"""
+
+# Неуникальные индексы этих таблиц при большом импорте снимаем и строим
+# заново в конце: одна сортировка дешевле обновления B-дерева на каждую строку
+DEFERRED_INDEX_TABLES = ("skis", "price_history")
+# С скольких новых файлов за раз считаем импорт большим
+# (в пустую price_history индексы откладываем всегда)
+DEFER_INDEXES_MIN_FILES = 10
+
+# Отметка "лыжа есть в выгрузке" для уже известной лыжи; orig_price
+# дозаполняется, только если в БД его ещё нет (COALESCE с NULL ничего не меняет)
+SKI_TOUCH_SQL = (
+    "UPDATE skis SET orig_price = COALESCE(orig_price, ?), last_seen_at = ?, is_active = 1 "
+    "WHERE id = ?"
+)
+
+# Имя SAVEPOINT, которым process_csv_file оборачивает один файл
+FILE_SAVEPOINT = "import_file"
+
 
 # ──────────────────────────────────────────────────────────────
 # LOGGING CONFIG
 # ──────────────────────────────────────────────────────────────
 
-logging.basicConfig(
-    filename=str(LOG_FILE),
-    level=logging.INFO,
-    encoding="utf-8",
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+def setup_logging() -> None:
+    """
+    Лог в LOG_FILE + консоль. Вызывается только при запуске файла как скрипта:
+    при импорте (например, из manage_data.py) логирование настраивает вызывающий.
+    """
+    LOG_DIR.mkdir(exist_ok=True)
+
+    logging.basicConfig(
+        filename=str(LOG_FILE),
+        level=logging.INFO,
+        encoding="utf-8",
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
 
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter("%(message)s"))
-logging.getLogger().addHandler(console)
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger().addHandler(console)
 
 
 # ──────────────────────────────────────────────────────────────
@@ -57,15 +96,16 @@ def now_iso() -> str:
     return datetime.now(UTC).replace(microsecond=0).isoformat()
 
 
-def parse_float(value: str) -> Optional[float]:
-    if value is None:
-        return None
-    v = str(value).strip()
-    if not v:
+# Десятичная запятая -> точка; translate за один проход в C
+_DECIMAL_COMMA = str.maketrans(",", ".")
+
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    """Число из ячейки CSV ('1700', '180,5'); пусто / мусор -> None."""
+    if not value:
         return None
-    v = v.replace(",", ".")
     try:
-        return float(v)
+        return float(value.translate(_DECIMAL_COMMA).strip())
     except ValueError:
         return None
 
@@ -74,9 +114,78 @@ def parse_float(value: str) -> Optional[float]:
 # DB HELPERS
 # ──────────────────────────────────────────────────────────────
 
+def ensure_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Досоздаёт индексы, которых может не быть в БД, созданной старой версией
+    create_db. Статистику для планировщика (ANALYZE) пересобирает, только если
+    набор индексов изменился или статистики ещё нет, а не на каждом импорте.
+    """
+    before = _schema_objects(conn)
+    conn.executescript(IMPORT_INDEXES_SQL)
+    after = _schema_objects(conn)
+    if after != before or "sqlite_stat1" not in after:
+        conn.execute("ANALYZE;")
+    conn.commit()
+
+
+def _schema_objects(conn: sqlite3.Connection) -> set:
+    """Имена индексов и таблиц БД (sqlite_stat1 — признак того, что ANALYZE уже был)."""
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'table')")
+    return {name for (name,) in rows}
+
+
+def should_defer_indexes(conn: sqlite3.Connection, new_files: List[Path]) -> bool:
+    """
+    Откладывать ли индексы: при первом (полном) импорте или при большой пачке
+    файлов. При обычном импорте одного-двух файлов в большую БД пересборка
+    индексов по всей таблице обошлась бы дороже их обновления.
+    """
+    if len(new_files) >= DEFER_INDEXES_MIN_FILES:
+        return True
+    return conn.execute("SELECT 1 FROM price_history LIMIT 1").fetchone() is None
+
+
+def drop_secondary_indexes(conn: sqlite3.Connection) -> List[str]:
+    """
+    Удаляет неуникальные индексы DEFERRED_INDEX_TABLES и возвращает их
+    CREATE INDEX для recreate_indexes. UNIQUE-индексы (в том числе
+    автоиндексы ограничений, у них sql IS NULL) не трогаем: на них держится
+    дедупликация и поиск лыжи по ключу.
+    """
+    placeholders = ", ".join("?" * len(DEFERRED_INDEX_TABLES))
+    rows = conn.execute(
+        f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index'
+          AND sql IS NOT NULL
+          AND sql NOT LIKE 'CREATE UNIQUE%'
+          AND tbl_name IN ({placeholders})
+        """,
+        DEFERRED_INDEX_TABLES,
+    ).fetchall()
+
+    for name, _sql in rows:
+        conn.execute(f'DROP INDEX "{name}";')
+    return [sql for _name, sql in rows]
+
+
+def recreate_indexes(conn: sqlite3.Connection, statements: List[str]) -> None:
+    """Строит заново индексы, снятые drop_secondary_indexes, и обновляет статистику."""
+    if not statements:
+        return
+    for sql in statements:
+        conn.execute(sql)
+    conn.execute("ANALYZE;")
+
+
 def get_processed_files(conn: sqlite3.Connection) -> set:
-    cur = conn.execute("SELECT file_name FROM processed_files;")
-    return {row[0] for row in cur.fetchall()}
+    # множество строим прямо по курсору, без промежуточного fetchall()
+    return {file_name for (file_name,) in conn.execute("SELECT file_name FROM processed_files;")}
+
+
+def load_shop_ids(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Все магазины одним запросом: code -> id."""
+    return dict(conn.execute("SELECT code, id FROM shops"))
 
 
 def get_or_create_shop(conn: sqlite3.Connection, code: str) -> int:
@@ -103,7 +212,16 @@ def get_or_create_ski(
     condition: str,
     url: str,
     orig_price: Optional[float],
+    now: str,
+    ski_updates: List[Tuple[Optional[float], str, int]],
 ) -> int:
+    """
+    id лыжи по ключу (shop_id, url, length_cm, condition); новой — INSERT.
+
+    Для уже существующей лыжи UPDATE не выполняется сразу: в ski_updates
+    добавляется (orig_price, now, ski_id), а process_csv_file применяет
+    их одним executemany (SKI_TOUCH_SQL) в конце файла.
+    """
     condition = (condition or "new").strip()
     brand = (brand or "").strip()
     model = (model or "").strip()
@@ -111,29 +229,19 @@ def get_or_create_ski(
 
     cur = conn.execute(
         """
-        SELECT id, orig_price FROM skis
+        SELECT id FROM skis
         WHERE shop_id = ?
           AND url = ?
-          AND ((length_cm IS NULL AND ? IS NULL) OR length_cm = ?)
+          AND length_cm IS ?
           AND condition = ?
         """,
-        (shop_id, url, length_cm, length_cm, condition),
+        (shop_id, url, length_cm, condition),
     )
     row = cur.fetchone()
-    now = now_iso()
 
     if row:
-        ski_id, db_orig_price = row
-        if db_orig_price is None and orig_price is not None:
-            conn.execute(
-                "UPDATE skis SET orig_price=?, last_seen_at=?, is_active=1 WHERE id=?",
-                (orig_price, now, ski_id),
-            )
-        else:
-            conn.execute(
-                "UPDATE skis SET last_seen_at=?, is_active=1 WHERE id=?",
-                (now, ski_id),
-            )
+        ski_id = row[0]
+        ski_updates.append((orig_price, now, ski_id))
         return ski_id
 
     cur = conn.execute(
@@ -149,31 +257,32 @@ def get_or_create_ski(
     return cur.lastrowid
 
 
-def create_scrape_run(conn, file_name, min_length, max_length) -> int:
+def create_scrape_run(conn, file_name, min_length, max_length, now) -> int:
     cur = conn.execute(
         """
         INSERT INTO scrape_runs(run_at, source_file, min_length_cm, max_length_cm, notes)
         VALUES (?, ?, ?, ?, ?)
         """,
-        (now_iso(), file_name, min_length, max_length, "auto-import"),
+        (now, file_name, min_length, max_length, "auto-import"),
     )
     return cur.lastrowid
 
 
-def insert_price_history(conn, ski_id, run_id, price):
-    conn.execute(
+def insert_price_history_many(conn, rows: List[tuple]) -> None:
+    """Пакетная вставка (ski_id, run_id, price, created_at) одним executemany."""
+    conn.executemany(
         "INSERT OR IGNORE INTO price_history(ski_id, run_id, price, created_at) VALUES (?, ?, ?, ?)",
-        (ski_id, run_id, price, now_iso()),
+        rows,
     )
 
 
-def mark_file_processed(conn, file_name, run_id):
+def mark_file_processed(conn, file_name, run_id, now):
     conn.execute(
         """
         INSERT INTO processed_files(file_name, run_id, processed_at)
         VALUES (?, ?, ?)
         """,
-        (file_name, run_id, now_iso()),
+        (file_name, run_id, now),
     )
 
 
@@ -181,64 +290,115 @@ def mark_file_processed(conn, file_name, run_id):
 # CSV PROCESSING
 # ──────────────────────────────────────────────────────────────
 
-def process_csv_file(conn: sqlite3.Connection, file_path: Path) -> None:
+def process_csv_file(
+    conn: sqlite3.Connection,
+    file_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
     file_name = file_path.name
     logging.info(f"Processing: {file_name}")
 
-    rows = []
-    lengths = []
-
-    with file_path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rows.append(row)
-            l = parse_float(row.get("length_cm"))
-            if l is not None:
-                lengths.append(l)
-
-    min_len = min(lengths) if lengths else None
-    max_len = max(lengths) if lengths else None
+    # одна метка времени на весь файл: импорт файла — одно событие
+    now = now_iso()
 
-    conn.execute("BEGIN;")
+    # Файл — точка сохранения: внутри общей транзакции main() её откат
+    # отменяет только этот файл, а вне транзакции RELEASE её же и коммитит
+    conn.execute(f"SAVEPOINT {FILE_SAVEPOINT};")
     try:
-        run_id = create_scrape_run(conn, file_name, min_len, max_len)
-
-        for row in rows:
-            shop_code = (row.get("shop") or "").strip()
-            brand = row.get("brand") or ""
-            model = row.get("model") or ""
-            condition = row.get("condition") or "new"
-            url = row.get("url") or ""
-
-            length_cm = parse_float(row.get("length_cm"))
-            orig_price = parse_float(row.get("orig_price"))
-            price = parse_float(row.get("price"))
-
-            if not shop_code or not url or price is None:
-                continue
-
-            shop_id = get_or_create_shop(conn, shop_code)
-            ski_id = get_or_create_ski(
-                conn,
-                shop_id,
-                brand,
-                model,
-                length_cm,
-                condition,
-                url,
-                orig_price,
-            )
-            insert_price_history(conn, ski_id, run_id, price)
-
-        mark_file_processed(conn, file_name, run_id)
-        conn.commit()
+        # CSV читаем одним потоковым проходом, без списка всех строк;
+        # диапазон длин известен только в конце — дописываем его в run потом
+        run_id = create_scrape_run(conn, file_name, None, None, now)
+        n_rows = 0
+        min_len: Optional[float] = None
+        max_len: Optional[float] = None
+
+        # price_history пишем пачками по chunk_size строк (executemany),
+        # skis/shops — по-прежнему построчно: нужен id сразу
+        price_batch: List[tuple] = []
+
+        # Один и тот же магазин / лыжа встречаются в файле много раз —
+        # в БД за каждым ключом ходим один раз за файл. Магазинов единицы,
+        # их id берём все сразу; новый магазин создаёт get_or_create_shop.
+        # ski_cache: (shop_id, url, length_cm, condition) -> (ski_id, orig_price уже записан)
+        shop_cache = load_shop_ids(conn)
+        ski_cache: Dict[Tuple[int, str, Optional[float], str], Tuple[int, bool]] = {}
+        # отложенные UPDATE известных лыж: (orig_price, now, ski_id), см. SKI_TOUCH_SQL
+        ski_updates: List[Tuple[Optional[float], str, int]] = []
+
+        with file_path.open("r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                n_rows += 1
+                length_cm = parse_float(row.get("length_cm"))
+                if length_cm is not None:
+                    if min_len is None or length_cm < min_len:
+                        min_len = length_cm
+                    if max_len is None or length_cm > max_len:
+                        max_len = length_cm
+
+                shop_code = (row.get("shop") or "").strip()
+                brand = row.get("brand") or ""
+                model = row.get("model") or ""
+                condition = row.get("condition") or "new"
+                url = row.get("url") or ""
+
+                orig_price = parse_float(row.get("orig_price"))
+                price = parse_float(row.get("price"))
+
+                if not shop_code or not url or price is None:
+                    continue
+
+                shop_id = shop_cache.get(shop_code)
+                if shop_id is None:
+                    shop_id = shop_cache[shop_code] = get_or_create_shop(conn, shop_code)
+
+                ski_key = (shop_id, url.strip(), length_cm, condition.strip())
+                cached = ski_cache.get(ski_key)
+                if cached is None:
+                    ski_id = get_or_create_ski(
+                        conn,
+                        shop_id,
+                        brand,
+                        model,
+                        length_cm,
+                        condition,
+                        url,
+                        orig_price,
+                        now,
+                        ski_updates,
+                    )
+                    ski_cache[ski_key] = (ski_id, orig_price is not None)
+                else:
+                    # лыжа уже отмечена активной в этом файле; дозаполняем только
+                    # orig_price, если его в БД ещё может не быть
+                    ski_id, orig_filled = cached
+                    if not orig_filled and orig_price is not None:
+                        ski_updates.append((orig_price, now, ski_id))
+                        ski_cache[ski_key] = (ski_id, True)
+                price_batch.append((ski_id, run_id, price, now))
+                if len(price_batch) >= chunk_size:
+                    insert_price_history_many(conn, price_batch)
+                    price_batch = []
+
+        if price_batch:
+            insert_price_history_many(conn, price_batch)
+
+        # известные лыжи отмечаем одним подготовленным UPDATE на все строки
+        conn.executemany(SKI_TOUCH_SQL, ski_updates)
+
+        conn.execute(
+            "UPDATE scrape_runs SET min_length_cm = ?, max_length_cm = ? WHERE id = ?",
+            (min_len, max_len, run_id),
+        )
+        mark_file_processed(conn, file_name, run_id, now)
+        conn.execute(f"RELEASE SAVEPOINT {FILE_SAVEPOINT};")
 
         logging.info(
-            f"Done: {file_name} | {len(rows)} rows | run_id={run_id} | range={min_len}-{max_len}"
+            f"Done: {file_name} | {n_rows} rows | run_id={run_id} | range={min_len}-{max_len}"
         )
 
     except Exception as e:
-        conn.rollback()
+        conn.execute(f"ROLLBACK TO SAVEPOINT {FILE_SAVEPOINT};")
+        conn.execute(f"RELEASE SAVEPOINT {FILE_SAVEPOINT};")
         logging.error(f"ERROR while processing {file_name}: {e}")
         raise
 
@@ -247,11 +407,22 @@ def process_csv_file(conn: sqlite3.Connection, file_path: Path) -> None:
 # MAIN
 # ──────────────────────────────────────────────────────────────
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Import skis_unified*.csv into DB")
     parser.add_argument("--db", default=str(DEFAULT_DB_PATH))
     parser.add_argument("--csv-dir", default=str(DEFAULT_CSV_DIR))
-    args = parser.parse_args()
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Сколько строк price_history вставлять одним executemany",
+    )
+    return parser.parse_args(argv)
+
+
+def main(args: Optional[argparse.Namespace] = None):
+    if args is None:
+        args = parse_args()
 
     db_path = Path(args.db)
     csv_dir = Path(args.csv_dir)
@@ -261,10 +432,11 @@ def main():
     logging.info(f"DB:  {db_path}")
     logging.info(f"CSV: {csv_dir}")
 
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn = connect(db_path)
 
     try:
+        ensure_indexes(conn)
+
         processed = get_processed_files(conn)
         logging.info(f"Already processed: {len(processed)}")
 
@@ -278,8 +450,19 @@ def main():
             logging.info("Nothing to import.")
             return
 
-        for f in new_files:
-            process_csv_file(conn, f)
+        # все файлы — одной транзакцией (один fsync на commit вместо одного на файл);
+        # если файл упал, уже импортированные до него всё равно коммитим
+        conn.execute("BEGIN;")
+        deferred_indexes: List[str] = []
+        if should_defer_indexes(conn, new_files):
+            deferred_indexes = drop_secondary_indexes(conn)
+            logging.info(f"Deferred {len(deferred_indexes)} indexes until the end of import")
+        try:
+            for f in new_files:
+                process_csv_file(conn, f, chunk_size=args.chunk_size)
+        finally:
+            recreate_indexes(conn, deferred_indexes)
+            conn.commit()
 
         logging.info("IMPORT FINISHED OK")
 
@@ -288,4 +471,5 @@ def main():
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
@@ -0,0 +1,129 @@
+"""
+detect_changes (три INSERT ... SELECT внутри SQLite) против прежней логики:
+цены двух run'ов загружаются в Python, разница считается множествами.
+
+Запуск из корня проекта: python -m unittest discover -s tests -t .
+"""
+
+import random
+import sqlite3
+import sys
+import unittest
+from pathlib import Path
+
+# скрипты update_db импортируются как пакет, как в manage_data.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from update_db import create_db, detect_db_changes  # noqa: E402
+from update_db.db_common import connect  # noqa: E402
+
+
+def _expected_changes_old(conn: sqlite3.Connection, old_run_id: int, new_run_id: int):
+    """Прежний detect_changes без записи в БД: (new_arrivals, sold_out, price_changes)."""
+
+    def load_prices(run_id):
+        cur = conn.execute("SELECT ski_id, price FROM price_history WHERE run_id = ?", (run_id,))
+        return {int(ski_id): float(price) for ski_id, price in cur.fetchall()}
+
+    old_prices = load_prices(old_run_id)
+    new_prices = load_prices(new_run_id)
+    old_set, new_set = set(old_prices), set(new_prices)
+    price_changes = {
+        (ski_id, old_prices[ski_id], new_prices[ski_id])
+        for ski_id in old_set & new_set
+        if old_prices[ski_id] != new_prices[ski_id]
+    }
+    return new_set - old_set, old_set - new_set, price_changes
+
+
+def _stored_changes(conn: sqlite3.Connection, run_id: int):
+    def rows(sql):
+        return set(conn.execute(sql, (run_id,)).fetchall())
+
+    new_arrivals = {s for (s,) in rows("SELECT ski_id FROM changes_new_arrival WHERE run_id = ?")}
+    sold_out = {s for (s,) in rows("SELECT ski_id FROM changes_sold_out WHERE run_id = ?")}
+    price_changes = rows(
+        "SELECT ski_id, old_price, new_price FROM changes_price_change WHERE run_id = ?"
+    )
+    return new_arrivals, sold_out, price_changes
+
+
+class DetectChangesEquivalenceTest(unittest.TestCase):
+    def setUp(self):
+        # isolation_level=None — как в detect_db_changes.main: транзакцию открывает сам detect_changes
+        self.conn = connect(":memory:", isolation_level=None)
+        create_db.create_schema(self.conn)
+        self.conn.execute("INSERT INTO shops (code, name) VALUES ('shop', 'Shop')")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _fill(self, rng: random.Random, n_skis: int = 300, n_runs: int = 3) -> None:
+        conn = self.conn
+        conn.execute("BEGIN")
+        conn.executemany(
+            """
+            INSERT INTO skis (shop_id, model, length_cm, condition, url,
+                              first_seen_at, last_seen_at)
+            VALUES (1, ?, ?, 'new', ?, 'x', 'x')
+            """,
+            [(f"m{i}", rng.choice([None, 160.0, 170.0]), f"u{i}") for i in range(n_skis)],
+        )
+        for run in range(1, n_runs + 1):
+            conn.execute(
+                "INSERT INTO scrape_runs (run_at, source_file) VALUES (?, ?)",
+                (f"2026-01-0{run}T00:00:00", f"run{run}.csv"),
+            )
+            conn.executemany(
+                "INSERT INTO price_history (ski_id, run_id, price, created_at) VALUES (?, ?, ?, 'x')",
+                [
+                    (ski_id, run, rng.choice([100.0, 199.99, 250.5, 1000.0]))
+                    for ski_id in range(1, n_skis + 1)
+                    if rng.random() < 0.8
+                ],
+            )
+        conn.execute("COMMIT")
+
+    def test_matches_old_logic_on_random_runs(self):
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                self.tearDown()
+                self.setUp()
+                self._fill(random.Random(seed))
+                old_run_id, new_run_id = detect_db_changes.get_last_two_runs(self.conn)
+                self.assertEqual((old_run_id, new_run_id), (2, 3))
+
+                expected = _expected_changes_old(self.conn, old_run_id, new_run_id)
+                detect_db_changes.detect_changes(self.conn, old_run_id, new_run_id)
+                self.assertEqual(_stored_changes(self.conn, new_run_id), expected)
+
+    def test_rerun_replaces_previous_changes(self):
+        self._fill(random.Random(1))
+        detect_db_changes.detect_changes(self.conn, 2, 3)
+        first = _stored_changes(self.conn, 3)
+
+        # повторный запуск для того же run'а не дублирует и не теряет записи
+        detect_db_changes.detect_changes(self.conn, 2, 3)
+        self.assertEqual(_stored_changes(self.conn, 3), first)
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_failure_keeps_previous_changes(self):
+        self._fill(random.Random(2))
+        detect_db_changes.detect_changes(self.conn, 2, 3)
+        before = _stored_changes(self.conn, 3)
+
+        # падение на последнем INSERT откатывает и очистку: старые изменения run'а на месте
+        self.conn.execute(
+            """
+            CREATE TEMP TRIGGER fail_price_change BEFORE INSERT ON changes_price_change
+            BEGIN SELECT RAISE(ABORT, 'boom'); END
+            """
+        )
+        with self.assertRaises(sqlite3.Error):
+            detect_db_changes.detect_changes(self.conn, 2, 3)
+        self.assertFalse(self.conn.in_transaction)
+        self.assertEqual(_stored_changes(self.conn, 3), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
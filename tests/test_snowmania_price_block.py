@@ -0,0 +1,115 @@
+"""
+parse_price_block (один проход PRICE_TAGGED_RE) против прежней реализации
+на двух re.search + списке чисел.
+
+Запуск из корня проекта: python -m unittest discover -s tests -t .
+"""
+
+import random
+import re
+import unittest
+from typing import Optional
+
+from src.shops.shop_snowmania_ge import parse_price_block
+
+_OLD_NUMBER_RE = re.compile(r"[\d.,]+")
+
+
+def _parse_price_block_old(text: str) -> tuple:
+    """Прежняя parse_price_block без изменений (эталон для сравнения)."""
+    if not text:
+        return None, None
+
+    text = text.replace("\xa0", " ").replace("₾.", "₾ ")
+
+    def _to_float(s: str) -> Optional[float]:
+        s = s.strip()
+        if not s:
+            return None
+        s = s.replace(",", "")
+        try:
+            return float(s)
+        except ValueError:
+            return None
+
+    orig_match = re.search(r"Original price was:\s*([\d.,]+)", text)
+    curr_match = re.search(r"Current price is:\s*([\d.,]+)", text)
+    orig = _to_float(orig_match.group(1)) if orig_match else None
+    curr = _to_float(curr_match.group(1)) if curr_match else None
+    if orig is not None and curr is not None:
+        return orig, curr
+
+    numbers: list = []
+    for raw in _OLD_NUMBER_RE.findall(text):
+        v = _to_float(raw)
+        if v is None:
+            continue
+        if v not in numbers:
+            numbers.append(v)
+
+    if not numbers:
+        return None, None
+    if "Original price was" in text and len(numbers) >= 2:
+        return max(numbers), min(numbers)
+    if len(numbers) == 1:
+        return numbers[0], numbers[0]
+    return max(numbers), min(numbers)
+
+
+# Куски, из которых собираются блоки цены: фразы WooCommerce, числа
+# в разных форматах (в том числе битые вроде "1..2" и одиночные "." / ","),
+# символ лари и пробелы, включая неразрывный
+_TOKENS = [
+    "Original price was:",
+    "Current price is:",
+    "Original price was",
+    "Current price is",
+    "₾",
+    "₾.",
+    " ",
+    "\xa0",
+    "  ",
+    "1,855.00",
+    "1855",
+    "999.99",
+    "0",
+    "12,5",
+    "1..2",
+    ".",
+    ",",
+    ".5",
+    "3.",
+    "sale",
+    "GEL",
+]
+
+
+class ParsePriceBlockEquivalenceTest(unittest.TestCase):
+    def assertSameAsOld(self, text: str) -> None:
+        self.assertEqual(parse_price_block(text), _parse_price_block_old(text), repr(text))
+
+    def test_typical_blocks(self):
+        for text in [
+            "",
+            "₾1,855.00",
+            "Original price was: ₾1,855.00. Current price is: ₾1,299.00.",
+            "Original price was: 1,855.00₾ Current price is: 1,299.00₾",
+            "Current price is: 700 Original price was: 900",
+            "Original price was: ₾.1,855.00 1,299.00",
+            "Original price was: ₾900 ₾700 ₾800",
+            "Current price is: 500",
+            "sale ₾",
+            "₾ 1,000.00 – ₾ 1,200.00",
+            "Original price was: Current price is: 5",
+        ]:
+            self.assertSameAsOld(text)
+
+    def test_random_blocks(self):
+        rng = random.Random(20261014)
+        for _ in range(20_000):
+            text = "".join(rng.choice(_TOKENS) for _ in range(rng.randint(0, 10)))
+            self.assertSameAsOld(text)
+
+
+if __name__ == "__main__":
+    unittest.main()